@@ -0,0 +1,171 @@
+"""Compara el índice de permisos compilado con evaluar las reglas en cada consulta
+
+Uso (no necesita QGIS):
+    python benchmarks/bench_access_index.py [num_usuarios] [num_funciones]
+
+Genera un access_control.json y un manifiesto sintéticos reproducibles
+(por defecto 10.000 usuarios y 1.000 funciones), mide el tiempo de
+compilación, de guardado y carga de la caché y el de las consultas, y
+comprueba que ambos métodos dan el mismo resultado.
+"""
+
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "tools"))
+
+from compile_access import cargar_indice, compilar, IndicePermisos  # noqa: E402
+
+
+def generar_datos(num_usuarios, num_funciones, semilla=42):
+    """Reglas y manifiesto sintéticos con grupos, comodines y tokens"""
+    aleatorio = random.Random(semilla)
+    carpetas = [f"carpeta_{i:02d}" for i in range(20)]
+    funciones = [{"folder": aleatorio.choice(carpetas), "file": f"funcion_{i:04d}.py"}
+                 for i in range(num_funciones)]
+    nombres = [os.path.splitext(funcion["file"])[0] for funcion in funciones]
+    
+    usuarios = {}
+    for i in range(num_usuarios):
+        nivel = aleatorio.choices(["admin", "analyst", "user", "limited"], [1, 20, 60, 19])[0]
+        usuario = {
+            "access_level": nivel,
+            "allowed_folders": aleatorio.sample(carpetas, aleatorio.randint(1, 5)),
+            "denied_functions": aleatorio.sample(nombres, aleatorio.randint(0, 10)),
+        }
+        if nivel == "limited":
+            usuario["allowed_functions"] = aleatorio.sample(nombres, 5)
+            usuario["denied_functions"] = ["*"]
+        elif aleatorio.random() < 0.05:
+            usuario["allowed_folders"] = ["*"]
+        usuarios[f"usuario_{i:05d}"] = usuario
+    
+    ids = list(usuarios)
+    grupos = {}
+    for i in range(200):
+        grupos[f"grupo_{i:03d}"] = {
+            "members": aleatorio.sample(ids, min(len(ids), 100)),
+            "allowed_folders": aleatorio.sample(carpetas, 2),
+            "additional_functions": aleatorio.sample(nombres, 3),
+            "denied_functions": aleatorio.sample(nombres, 3),
+        }
+    
+    tokens = {}
+    for i, id_usuario in enumerate(ids):
+        anio = aleatorio.choice([2020, 2099])
+        tokens[f"tk_{i:05d}"] = {"user": id_usuario, "expires": f"{anio}-12-31"}
+    
+    control = {"access_control": {
+        "enabled": True,
+        "default_access": "deny",
+        "users": usuarios,
+        "groups": grupos,
+        "tokens": tokens,
+    }}
+    return control, {"version": 1, "functions": funciones}
+
+
+def evaluar_reglas(reglas, id_usuario, carpeta, funcion):
+    """Evaluación directa de las reglas, como se hace al construir el menú"""
+    usuario = reglas["users"].get(id_usuario)
+    if usuario is None:
+        return False
+    if usuario.get("access_level") == "admin":
+        return True
+    if funcion in usuario.get("allowed_functions", []):
+        return True
+    denegadas = usuario.get("denied_functions", [])
+    if "*" in denegadas or funcion in denegadas:
+        return False
+    
+    grupos = [grupo for grupo in reglas.get("groups", {}).values()
+              if id_usuario in grupo.get("members", [])]
+    carpetas = usuario.get("allowed_folders", [])
+    if "*" in carpetas or carpeta in carpetas:
+        return True
+    for grupo in grupos:
+        permitidas = grupo.get("allowed_functions", []) + grupo.get("additional_functions", [])
+        if "*" in permitidas or funcion in permitidas:
+            return True
+    for grupo in grupos:
+        denegadas = grupo.get("denied_functions", [])
+        if "*" in denegadas or funcion in denegadas:
+            return False
+    for grupo in grupos:
+        carpetas = grupo.get("allowed_folders", [])
+        if "*" in carpetas or carpeta in carpetas:
+            return True
+    return reglas.get("default_access", "deny") == "allow"
+
+
+def main():
+    num_usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_funciones = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    
+    control, manifiesto = generar_datos(num_usuarios, num_funciones)
+    reglas = control["access_control"]
+    print(f"{num_usuarios} usuarios, {num_funciones} funciones, "
+          f"{len(reglas['groups'])} grupos, {len(reglas['tokens'])} tokens")
+    
+    inicio = time.perf_counter()
+    indice = compilar(control, manifiesto)
+    print(f"Compilación:            {time.perf_counter() - inicio:8.3f} s "
+          f"({len(indice['masks'])} máscaras distintas, "
+          f"{len(indice['tokens'])} tokens vigentes)")
+    
+    temporal = tempfile.mkdtemp(prefix="bench_access_")
+    try:
+        ruta_control = os.path.join(temporal, "access_control.json")
+        ruta_manifiesto = os.path.join(temporal, "manifest.json")
+        with open(ruta_control, 'w', encoding='utf-8') as archivo:
+            json.dump(control, archivo)
+        with open(ruta_manifiesto, 'w', encoding='utf-8') as archivo:
+            json.dump(manifiesto, archivo)
+        
+        inicio = time.perf_counter()
+        cargar_indice(temporal, ruta_control, ruta_manifiesto)
+        print(f"Compilar y guardar:     {time.perf_counter() - inicio:8.3f} s")
+        inicio = time.perf_counter()
+        permisos = cargar_indice(temporal, ruta_control, ruta_manifiesto)
+        print(f"Cargar desde caché:     {time.perf_counter() - inicio:8.3f} s")
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    
+    # Consultas: un menú completo (todas las funciones) para usuarios al azar
+    aleatorio = random.Random(7)
+    consultas = [(id_usuario, funcion["folder"], os.path.splitext(funcion["file"])[0])
+                 for id_usuario in aleatorio.sample(list(reglas["users"]), 20)
+                 for funcion in manifiesto["functions"]]
+    
+    inicio = time.perf_counter()
+    directas = [evaluar_reglas(reglas, *consulta) for consulta in consultas]
+    segundos_directo = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    compiladas = [permisos.permitido_usuario(*consulta) for consulta in consultas]
+    segundos_indice = time.perf_counter() - inicio
+    
+    print(f"Reglas en cada consulta: {len(consultas) / segundos_directo:12,.0f} consultas/s")
+    print(f"Índice compilado:        {len(consultas) / segundos_indice:12,.0f} consultas/s "
+          f"(x{segundos_directo / segundos_indice:,.0f})")
+    
+    assert directas == compiladas, "El índice no coincide con las reglas"
+    assert isinstance(permisos, IndicePermisos)
+    
+    # Tokens caducados en 2020 ya no dan acceso
+    caducado = next(token for token, datos in reglas["tokens"].items()
+                    if datos["expires"].startswith("2020"))
+    funcion = manifiesto["functions"][0]
+    assert not permisos.permitido(caducado, funcion["folder"],
+                                  os.path.splitext(funcion["file"])[0])
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
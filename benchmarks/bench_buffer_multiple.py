@@ -0,0 +1,105 @@
+"""Compara el motor de anillos de buffer_multiple con el algoritmo anterior
+
+Uso (con el Python de QGIS):
+    python benchmarks/bench_buffer_multiple.py [num_entidades] [num_anillos]
+
+Genera polígonos sintéticos reproducibles, calcula los anillos con el
+algoritmo anterior (2N-1 buffers por entidad) y con el motor actual
+(N buffers por entidad), e informa tiempos y la diferencia de área entre
+ambas salidas.
+"""
+
+import importlib.util
+import os
+import random
+import sys
+import time
+
+from qgis.core import QgsApplication, QgsGeometry, QgsPointXY
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cargar_funcion(ruta_relativa):
+    """Carga un módulo de functions/ igual que lo hace el menú"""
+    ruta = os.path.join(RAIZ, "functions", ruta_relativa)
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    spec = importlib.util.spec_from_file_location(nombre, ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def generar_bloque(num_entidades, semilla=42):
+    """Polígonos irregulares reproducibles en formato (fid, WKB)"""
+    aleatorio = random.Random(semilla)
+    bloque = []
+    for fid in range(num_entidades):
+        x = aleatorio.uniform(0, 100000)
+        y = aleatorio.uniform(0, 100000)
+        puntos = [QgsPointXY(x + aleatorio.uniform(-50, 50),
+                             y + aleatorio.uniform(-50, 50))
+                  for _ in range(8)]
+        geom = QgsGeometry.fromMultiPointXY(puntos).convexHull()
+        bloque.append((fid, bytes(geom.asWkb())))
+    return bloque
+
+
+def anillos_anterior(bloque, distancias, segmentos=10):
+    """Algoritmo anterior: bufferiza de nuevo la distancia interior"""
+    resultados = []
+    for fid, wkb in bloque:
+        geom = QgsGeometry()
+        geom.fromWkb(wkb)
+        for i, distancia in enumerate(distancias):
+            buffer = geom.buffer(distancia, segmentos)
+            if i > 0:
+                buffer_interior = geom.buffer(distancias[i - 1], segmentos)
+                buffer = buffer.difference(buffer_interior)
+            resultados.append((fid, distancia, i + 1, bytes(buffer.asWkb())))
+    return resultados
+
+
+def comparar(anterior, actual):
+    """Devuelve la mayor diferencia relativa de área entre ambas salidas"""
+    maxima = 0.0
+    for a, b in zip(anterior, actual):
+        geom_a = QgsGeometry()
+        geom_a.fromWkb(a[3])
+        geom_b = QgsGeometry()
+        geom_b.fromWkb(b[3])
+        area = geom_a.area() or 1.0
+        maxima = max(maxima, geom_a.symDifference(geom_b).area() / area)
+    return maxima
+
+
+def main():
+    num_entidades = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_anillos = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    distancias = [100 * (i + 1) for i in range(num_anillos)]
+
+    app = QgsApplication([], False)
+    app.initQgis()
+    try:
+        modulo = cargar_funcion(os.path.join("analysis", "buffer_multiple.py"))
+        bloque = generar_bloque(num_entidades)
+
+        inicio = time.perf_counter()
+        anterior = anillos_anterior(bloque, distancias)
+        t_anterior = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        actual = modulo._anillos_bloque(bloque, distancias)
+        t_actual = time.perf_counter() - inicio
+
+        print(f"Entidades: {num_entidades}  Anillos: {num_anillos}")
+        print(f"Anterior: {t_anterior:.2f} s")
+        print(f"Actual:   {t_actual:.2f} s")
+        print(f"Aceleración: {t_anterior / t_actual:.2f}x")
+        print(f"Diferencia relativa de área máxima: {comparar(anterior, actual):.2e}")
+    finally:
+        app.exitQgis()
+
+
+if __name__ == "__main__":
+    main()
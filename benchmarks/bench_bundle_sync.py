@@ -0,0 +1,120 @@
+"""Mide la sincronización de la caché contra un servidor HTTP local
+
+Uso (no necesita QGIS):
+    python benchmarks/bench_bundle_sync.py [latencia_ms]
+
+Publica una copia de functions/ con tools/build_bundle.py en una carpeta
+temporal, la sirve con un servidor HTTP local que añade ETag y una
+latencia fija por petición (para simular la VPN) y ejecuta el cliente de
+tools/bundle_client.py en los tres casos: caché vacía, caché al día y un
+archivo modificado. Falla si el cliente no se comporta como se espera.
+"""
+
+import functools
+import hashlib
+import http.server
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "tools"))
+
+from build_bundle import construir_paquete  # noqa: E402
+from bundle_client import sincronizar  # noqa: E402
+
+
+class ServidorLocal(http.server.SimpleHTTPRequestHandler):
+    """Servidor estático con ETag, latencia simulada y contador de peticiones"""
+    
+    latencia = 0.0
+    peticiones = 0
+    
+    def send_head(self):
+        type(self).peticiones += 1
+        time.sleep(self.latencia)
+        ruta = self.translate_path(self.path)
+        if os.path.isfile(ruta):
+            with open(ruta, 'rb') as archivo:
+                etag = '"' + hashlib.sha256(archivo.read()).hexdigest()[:32] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return None
+            self._etag = etag
+        return super().send_head()
+    
+    def end_headers(self):
+        if getattr(self, "_etag", None):
+            self.send_header("ETag", self._etag)
+            self._etag = None
+        super().end_headers()
+    
+    def log_message(self, formato, *args):
+        pass
+
+
+def medir(nombre, url, cache):
+    ServidorLocal.peticiones = 0
+    inicio = time.perf_counter()
+    resultado = sincronizar(url, cache)
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<20} {resultado['status']:<12} {resultado['peticiones']:>4} peticiones "
+          f"{resultado['descargados']:>4} descargados {segundos:8.3f} s")
+    assert resultado["peticiones"] == ServidorLocal.peticiones
+    return resultado
+
+
+def main():
+    latencia_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ServidorLocal.latencia = latencia_ms / 1000.0
+    
+    temporal = tempfile.mkdtemp(prefix="bench_bundle_")
+    try:
+        arbol = os.path.join(temporal, "repo")
+        publicado = os.path.join(temporal, "publicado")
+        cache = os.path.join(temporal, "cache")
+        shutil.copytree(os.path.join(RAIZ, "functions"), os.path.join(arbol, "functions"),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        indice = construir_paquete(publicado, arbol)
+        
+        manejador = functools.partial(ServidorLocal, directory=publicado)
+        servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), manejador)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{servidor.server_address[1]}"
+        
+        print(f"{indice['functions']} funciones, latencia {latencia_ms:.0f} ms por petición")
+        print(f"Descarga archivo a archivo: ~{indice['functions'] + 1} peticiones")
+        
+        primero = medir("Caché vacía", url, cache)
+        assert primero["status"] == "completo" and primero["peticiones"] == 2
+        
+        al_dia = medir("Caché al día", url, cache)
+        assert al_dia["status"] == "sin_cambios" and al_dia["peticiones"] == 1
+        
+        # Modificar una función y publicar una versión nueva
+        ruta = os.path.join(arbol, "functions", "utilities", "zoom_active_layer.py")
+        with open(ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write("\n# cambio de prueba\n")
+        construir_paquete(publicado, arbol)
+        
+        cambio = medir("Un archivo cambiado", url, cache)
+        assert cambio["status"] == "actualizado" and cambio["descargados"] == 1
+        assert cambio["peticiones"] == 3
+        
+        with open(os.path.join(cache, "functions", "utilities", "zoom_active_layer.py"),
+                  encoding='utf-8') as archivo:
+            assert archivo.read().endswith("# cambio de prueba\n")
+        
+        servidor.shutdown()
+        print("OK")
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
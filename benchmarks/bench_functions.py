@@ -0,0 +1,306 @@
+"""Banco de pruebas de las funciones sobre capas sintéticas
+
+Uso (con el Python de QGIS):
+    python benchmarks/bench_functions.py [--tamanos 1000,10000,100000,1000000]
+                                         [--funciones buffer_multiple,...]
+                                         [--salida resultados.json]
+
+Genera capas de memoria reproducibles (puntos y polígonos con un 2 % de
+geometrías inválidas y un 0,5 % vacías, con un campo de texto de baja
+cardinalidad y otro de alta cardinalidad) y ejecuta cada función con una
+iface simulada sobre un QgsApplication sin ventanas. Cada caso corre en un
+proceso propio, y la memoria residente (RSS) se muestrea solo mientras
+corre la función: el pico registrado no incluye la generación de la capa.
+
+El resultado se guarda en JSON (por defecto en benchmarks/resultados/)
+con el tiempo, las entidades por segundo y el pico de RSS de cada caso,
+junto con el commit y la versión de QGIS, para comparar entre commits.
+"""
+
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "tools"))
+CARPETA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+TAMANOS = [1000, 10000, 100000, 1000000]
+
+# nombre del caso: (archivo en functions/, capa, parámetros)
+# Las rutas de salida se completan en el proceso hijo con una carpeta temporal
+CASOS = {
+    "buffer_multiple": ("analysis/buffer_multiple.py", "puntos",
+                        {"distancia_inicial": 10, "incremento": 10, "num_anillos": 3}),
+    "clean_geometries": ("quality/clean_geometries.py", "poligonos",
+                         {"usar_cache": False}),
+    "categorize_layer": ("cartography/categorize_layer.py", "poligonos",
+                         {"campo": "categoria", "usar_cache": False}),
+    "categorize_layer_alta_cardinalidad": ("cartography/categorize_layer.py", "puntos",
+                                           {"campo": "codigo", "usar_cache": False}),
+    "export_to_excel": ("data/export_to_excel.py", "puntos",
+                        {"abrir_carpeta": False}),
+    "zoom_active_layer": ("utilities/zoom_active_layer.py", "poligonos",
+                          {"refresh": True}),
+    "print_map_pdf": ("cartography/print_map_pdf.py", "poligonos",
+                      {"layout_name": "bench", "dpi": 150, "use_cache": False}),
+}
+
+CATEGORIAS = ["residencial", "comercial", "industrial", "agricola", "forestal",
+              "equipamiento", "infraestructura", "agua", "protegido", "otros"]
+
+
+def cargar_funcion(ruta_relativa):
+    """Carga un módulo de functions/ igual que lo hace el menú"""
+    ruta = os.path.join(RAIZ, "functions", ruta_relativa)
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    spec = importlib.util.spec_from_file_location(nombre, ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def generar_capa(tipo, num_entidades, semilla=42):
+    """Capa de memoria reproducible de puntos o polígonos"""
+    from qgis.core import (QgsFeature, QgsField, QgsGeometry, QgsPointXY,
+                           QgsVectorLayer)
+    from qgis.PyQt.QtCore import QVariant
+    
+    geometria = "Point" if tipo == "puntos" else "Polygon"
+    capa = QgsVectorLayer(f"{geometria}?crs=EPSG:3857", tipo, "memory")
+    proveedor = capa.dataProvider()
+    proveedor.addAttributes([
+        QgsField("id", QVariant.Int),
+        QgsField("categoria", QVariant.String),
+        QgsField("codigo", QVariant.String),
+        QgsField("valor", QVariant.Double),
+    ])
+    capa.updateFields()
+    
+    aleatorio = random.Random(semilla)
+    # Densidad constante: la extensión crece con el número de entidades
+    lado = 1000.0 * max(1.0, num_entidades ** 0.5)
+    lote = []
+    for i in range(num_entidades):
+        entidad = QgsFeature(capa.fields())
+        entidad.setAttributes([
+            i,
+            aleatorio.choice(CATEGORIAS),
+            f"C{aleatorio.getrandbits(48):012x}",
+            aleatorio.gauss(100.0, 25.0),
+        ])
+        x = aleatorio.uniform(0, lado)
+        y = aleatorio.uniform(0, lado)
+        if tipo == "puntos":
+            entidad.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        else:
+            sorteo = aleatorio.random()
+            if sorteo < 0.005:
+                entidad.setGeometry(QgsGeometry())
+            elif sorteo < 0.025:
+                # Pajarita: anillo que se cruza a sí mismo
+                entidad.setGeometry(QgsGeometry.fromPolygonXY([[
+                    QgsPointXY(x, y), QgsPointXY(x + 50, y + 50),
+                    QgsPointXY(x + 50, y), QgsPointXY(x, y + 50), QgsPointXY(x, y)
+                ]]))
+            else:
+                tamano = aleatorio.uniform(10, 100)
+                entidad.setGeometry(QgsGeometry.fromPolygonXY([[
+                    QgsPointXY(x, y), QgsPointXY(x + tamano, y),
+                    QgsPointXY(x + tamano, y + tamano * 0.8),
+                    QgsPointXY(x + tamano * 0.4, y + tamano),
+                    QgsPointXY(x, y)
+                ]]))
+        lote.append(entidad)
+        if len(lote) >= 50000:
+            proveedor.addFeatures(lote)
+            lote = []
+    if lote:
+        proveedor.addFeatures(lote)
+    capa.updateExtents()
+    return capa
+
+
+def crear_composicion(proyecto, capa):
+    """Composición 'bench' con un mapa de la capa a página completa"""
+    from qgis.core import (QgsLayoutItemMap, QgsLayoutPoint, QgsLayoutSize,
+                           QgsPrintLayout, QgsUnitTypes)
+    
+    composicion = QgsPrintLayout(proyecto)
+    composicion.initializeDefaults()
+    composicion.setName("bench")
+    mapa = QgsLayoutItemMap(composicion)
+    mapa.attemptMove(QgsLayoutPoint(5, 5, QgsUnitTypes.LayoutMillimeters))
+    mapa.attemptResize(QgsLayoutSize(287, 200, QgsUnitTypes.LayoutMillimeters))
+    mapa.setLayers([capa])
+    mapa.setKeepLayerSet(True)
+    mapa.setExtent(capa.extent())
+    composicion.addLayoutItem(mapa)
+    proyecto.layoutManager().addLayout(composicion)
+
+
+class IfaceSimulada:
+    """Lo mínimo de QgisInterface que usan las funciones"""
+    
+    class _ArbolCapas:
+        def refreshLayerSymbology(self, id_capa):
+            pass
+    
+    def __init__(self, capa, lienzo):
+        self._capa = capa
+        self._lienzo = lienzo
+        self._arbol = self._ArbolCapas()
+    
+    def activeLayer(self):
+        return self._capa
+    
+    def mapCanvas(self):
+        return self._lienzo
+    
+    def mainWindow(self):
+        return None
+    
+    def layerTreeView(self):
+        return self._arbol
+
+
+def ejecutar_caso(nombre, num_entidades):
+    """Ejecuta un caso en este proceso y devuelve sus métricas"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from qgis.core import QgsApplication, QgsFeedback, QgsProject, Qgis
+    from qgis.gui import QgsMapCanvas
+    from instrumented_runner import _MonitorMemoria
+    
+    app = QgsApplication([], True)
+    app.initQgis()
+    temporal = tempfile.mkdtemp(prefix="bench_funciones_")
+    try:
+        ruta, tipo_capa, parametros = CASOS[nombre]
+        parametros = dict(parametros)
+        parametros["feedback"] = QgsFeedback()
+        if nombre == "export_to_excel":
+            parametros["output_path"] = os.path.join(temporal, "salida.xlsx")
+        elif nombre == "print_map_pdf":
+            parametros["output_folder"] = temporal
+        
+        modulo = cargar_funcion(ruta)
+        capa = generar_capa(tipo_capa, num_entidades)
+        proyecto = QgsProject.instance()
+        proyecto.addMapLayer(capa)
+        if nombre == "print_map_pdf":
+            crear_composicion(proyecto, capa)
+        
+        lienzo = QgsMapCanvas()
+        lienzo.setDestinationCrs(capa.crs())
+        iface = IfaceSimulada(capa, lienzo)
+        funcion = getattr(modulo, "ejecutar", None) or modulo.execute
+        
+        # Muestrear la memoria solo durante la función
+        monitor = _MonitorMemoria()
+        monitor.start()
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(iface, parametros)
+        finally:
+            segundos = time.perf_counter() - inicio
+            monitor.detener()
+        rss_antes, rss_pico = monitor.inicial, monitor.pico
+        
+        return {
+            "funcion": nombre,
+            "entidades": num_entidades,
+            "status": resultado.get("status"),
+            "mensaje": resultado.get("mensaje") or resultado.get("message"),
+            "segundos": round(segundos, 4),
+            "entidades_por_segundo": round(num_entidades / segundos, 1) if segundos > 0 else None,
+            "rss_funcion_mb": round(rss_pico - rss_antes, 1)
+                              if rss_pico is not None and rss_antes is not None else None,
+            "rss_pico_mb": round(rss_pico, 1) if rss_pico is not None else None,
+            "rss_antes_mb": round(rss_antes, 1) if rss_antes is not None else None,
+            "qgis": Qgis.QGIS_VERSION,
+        }
+    finally:
+        QgsProject.instance().clear()
+        app.exitQgis()
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+def _commit_actual():
+    try:
+        proceso = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                 capture_output=True, text=True)
+        return proceso.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _opcion(argumentos, nombre, defecto):
+    if nombre in argumentos:
+        return argumentos[argumentos.index(nombre) + 1]
+    return defecto
+
+
+def main(argumentos):
+    # Proceso hijo: un solo caso
+    if "--caso" in argumentos:
+        metricas = ejecutar_caso(_opcion(argumentos, "--caso", None),
+                                 int(_opcion(argumentos, "--tamano", 1000)))
+        print(json.dumps(metricas, ensure_ascii=False))
+        return 0
+    
+    tamanos = [int(valor) for valor in
+               _opcion(argumentos, "--tamanos", ",".join(map(str, TAMANOS))).split(",")]
+    funciones = _opcion(argumentos, "--funciones", ",".join(CASOS)).split(",")
+    commit = _commit_actual()
+    salida = _opcion(argumentos, "--salida", os.path.join(
+        CARPETA_RESULTADOS,
+        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'sin_commit'}.json"
+    ))
+    
+    resultados = []
+    for nombre in funciones:
+        for tamano in tamanos:
+            proceso = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--caso", nombre,
+                 "--tamano", str(tamano)],
+                capture_output=True, text=True
+            )
+            if proceso.returncode == 0:
+                metricas = json.loads(proceso.stdout.strip().splitlines()[-1])
+            else:
+                lineas = proceso.stderr.strip().splitlines()
+                metricas = {"funcion": nombre, "entidades": tamano, "status": "error",
+                            "mensaje": lineas[-1] if lineas else f"código {proceso.returncode}"}
+            resultados.append(metricas)
+            
+            if metricas["status"] == "error" and "segundos" not in metricas:
+                print(f"{nombre:<36} {tamano:>9}  ERROR: {metricas['mensaje']}")
+            else:
+                print(f"{nombre:<36} {tamano:>9}  {metricas['segundos']:9.2f} s  "
+                      f"{metricas['entidades_por_segundo'] or 0:12,.0f} ent/s  "
+                      f"{metricas['rss_funcion_mb'] or 0:8.0f} MB  {metricas['status']}")
+    
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as archivo:
+        json.dump({
+            "commit": commit,
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "resultados": resultados,
+        }, archivo, indent=2, ensure_ascii=False)
+    print(f"Resultados en {salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
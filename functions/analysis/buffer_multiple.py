@@ -1,9 +1,189 @@
 """Crea buffers múltiples con distancias incrementales"""
 
 from qgis.core import (QgsProject, QgsVectorLayer, QgsFeature, 
-                       QgsGeometry, QgsField, QgsFields)
+                       QgsGeometry, QgsField, QgsFields, QgsFeatureRequest,
+                       QgsSymbol, QgsVectorFileWriter, QgsWkbTypes,
+                       QgsSpatialIndex)
 from qgis.PyQt.QtCore import QVariant
-import processing
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+# Formatos de archivo admitidos para la salida en disco
+_DRIVERS_SALIDA = {".gpkg": "GPKG", ".fgb": "FlatGeobuf"}
+
+
+def _crear_escritor(ruta, campos, tipo_geometria, crs):
+    """Crea un QgsVectorFileWriter para una salida GeoPackage o FlatGeobuf"""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in _DRIVERS_SALIDA:
+        raise ValueError(f"Formato de salida no soportado: '{extension}' (use .gpkg o .fgb)")
+    
+    opciones = QgsVectorFileWriter.SaveVectorOptions()
+    opciones.driverName = _DRIVERS_SALIDA[extension]
+    opciones.fileEncoding = "UTF-8"
+    opciones.layerName = os.path.splitext(os.path.basename(ruta))[0]
+    
+    escritor = QgsVectorFileWriter.create(
+        ruta, campos, tipo_geometria, crs,
+        QgsProject.instance().transformContext(), opciones
+    )
+    if escritor.hasError() != QgsVectorFileWriter.NoError:
+        raise IOError(escritor.errorMessage())
+    return escritor
+
+
+def _leer_lotes(entidades, tamano_lote):
+    """Agrupa las entidades en lotes de (id, WKB) sin cargar toda la capa"""
+    lote = []
+    for entidad in entidades:
+        lote.append((entidad.id(), bytes(entidad.geometry().asWkb())))
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _anillos_bloque(bloque, distancias, segmentos=10, tolerancia=0):
+    """
+    Calcula los anillos de un bloque de geometrías en formato WKB
+    
+    Se ejecuta en un hilo del pool: solo recibe y devuelve WKB para no
+    compartir objetos QgsFeature entre hilos. Cada distancia se bufferiza
+    una sola vez; el buffer exterior de un anillo es el interior del siguiente.
+    """
+    resultados = []
+    for fid, wkb in bloque:
+        geom = QgsGeometry()
+        geom.fromWkb(wkb)
+        
+        # Simplificar la geometría de origen antes de bufferizar
+        if tolerancia > 0:
+            geom = geom.simplify(tolerancia)
+        
+        exterior_anterior = None
+        for i, distancia in enumerate(distancias):
+            exterior = geom.buffer(distancia, segmentos)
+            
+            # Si no es el primer anillo, crear anillo (donut)
+            if exterior_anterior is None:
+                anillo = exterior
+            else:
+                anillo = exterior.difference(exterior_anterior)
+            exterior_anterior = exterior
+            
+            resultados.append((fid, distancia, i + 1, bytes(anillo.asWkb())))
+    return resultados
+
+
+def _dividir(lote, partes):
+    """Divide un lote en como máximo 'partes' bloques contiguos"""
+    tamano_bloque = max(1, -(-len(lote) // partes))
+    return [lote[j:j + tamano_bloque] for j in range(0, len(lote), tamano_bloque)]
+
+
+def _agrupar_por_envolvente(envolventes, margen):
+    """
+    Agrupa las entidades cuyos buffers de distancia 'margen' pueden tocarse
+    
+    Usa un QgsSpatialIndex sobre las envolventes ampliadas y une los
+    candidatos que se intersecan (union-find), de modo que cada grupo
+    se puede disolver por separado.
+    """
+    indice = QgsSpatialIndex()
+    for fid, rectangulo in envolventes.items():
+        rectangulo.grow(margen)
+        indice.addFeature(fid, rectangulo)
+    
+    padre = {fid: fid for fid in envolventes}
+    
+    def raiz(fid):
+        while padre[fid] != fid:
+            padre[fid] = padre[padre[fid]]
+            fid = padre[fid]
+        return fid
+    
+    for fid, rectangulo in envolventes.items():
+        for vecino in indice.intersects(rectangulo):
+            raiz_a, raiz_b = raiz(fid), raiz(vecino)
+            if raiz_a != raiz_b:
+                padre[raiz_b] = raiz_a
+    
+    grupos = {}
+    for fid in envolventes:
+        grupos.setdefault(raiz(fid), []).append(fid)
+    return list(grupos.values())
+
+
+def _anillos_disueltos(grupos, distancias, segmentos=10, tolerancia=0):
+    """
+    Calcula los anillos disueltos de una lista de grupos de geometrías WKB
+    
+    Para cada índice de anillo se unen los buffers exteriores del grupo
+    y se resta la unión del anillo anterior.
+    """
+    resultados = []
+    for grupo in grupos:
+        geometrias = []
+        for wkb in grupo:
+            geom = QgsGeometry()
+            geom.fromWkb(wkb)
+            if tolerancia > 0:
+                geom = geom.simplify(tolerancia)
+            geometrias.append(geom)
+        
+        exterior_anterior = None
+        for i, distancia in enumerate(distancias):
+            exterior = QgsGeometry.unaryUnion(
+                [geom.buffer(distancia, segmentos) for geom in geometrias]
+            )
+            
+            if exterior_anterior is None:
+                anillo = exterior
+            else:
+                anillo = exterior.difference(exterior_anterior)
+            exterior_anterior = exterior
+            
+            resultados.append((None, distancia, i + 1, bytes(anillo.asWkb())))
+    return resultados
+
+
+def _resultados_por_lotes(pool, entidades, distancias, segmentos, tolerancia,
+                          tamano_lote, hilos):
+    """Genera los anillos de cada lote de entidades repartidos entre los hilos"""
+    for lote in _leer_lotes(entidades, tamano_lote):
+        bloques = _dividir(lote, hilos)
+        n = len(bloques)
+        for resultados in pool.map(_anillos_bloque, bloques,
+                                   [distancias] * n, [segmentos] * n,
+                                   [tolerancia] * n):
+            yield resultados
+
+
+def _resultados_disueltos(pool, entidades, distancias, segmentos, tolerancia,
+                          tamano_lote, hilos):
+    """Genera los anillos disueltos por grupos de entidades cercanas"""
+    wkbs = {}
+    envolventes = {}
+    for lote in _leer_lotes(entidades, tamano_lote):
+        for fid, wkb in lote:
+            geom = QgsGeometry()
+            geom.fromWkb(wkb)
+            wkbs[fid] = wkb
+            envolventes[fid] = geom.boundingBox()
+    
+    grupos = _agrupar_por_envolvente(envolventes, max(distancias))
+    wkb_grupos = [[wkbs.pop(fid) for fid in grupo] for grupo in grupos]
+    
+    # Los grupos se procesan en lotes para seguir escribiendo a medida que terminan
+    for inicio in range(0, len(wkb_grupos), tamano_lote):
+        bloques = _dividir(wkb_grupos[inicio:inicio + tamano_lote], hilos)
+        n = len(bloques)
+        for resultados in pool.map(_anillos_disueltos, bloques,
+                                   [distancias] * n, [segmentos] * n,
+                                   [tolerancia] * n):
+            yield resultados
+
 
 def ejecutar(iface, params=None):
     """
@@ -11,7 +191,10 @@ def ejecutar(iface, params=None):
     
     Args:
         iface: Interfaz de QGIS
-        params: Diccionario con distancias y número de anillos
+        params: Diccionario con distancias, número de anillos y opciones
+                de procesamiento ('tamano_lote', 'hilos', 'segmentos',
+                'tolerancia_simplificacion', 'output_path' .gpkg/.fgb,
+                'disolver' para unir los anillos de entidades cercanas)
     
     Returns:
         dict: Estado y mensaje del resultado
@@ -24,20 +207,23 @@ def ejecutar(iface, params=None):
             "mensaje": "Seleccione una capa vectorial"
         }
     
-    # Obtener entidades seleccionadas o todas
-    if capa.selectedFeatureCount() > 0:
-        entidades = capa.selectedFeatures()
-        mensaje_seleccion = f"{capa.selectedFeatureCount()} entidades seleccionadas"
-    else:
-        entidades = list(capa.getFeatures())
-        mensaje_seleccion = f"todas las {capa.featureCount()} entidades"
-    
-    if not entidades:
+    if capa.featureCount() == 0:
         return {
             "status": "error",
             "mensaje": "La capa no tiene entidades"
         }
     
+    # Obtener entidades seleccionadas o todas (iterador, solo geometría)
+    peticion = QgsFeatureRequest().setNoAttributes()
+    if capa.selectedFeatureCount() > 0:
+        entidades = capa.getSelectedFeatures(peticion)
+        num_entidades = capa.selectedFeatureCount()
+        mensaje_seleccion = f"{num_entidades} entidades seleccionadas"
+    else:
+        entidades = capa.getFeatures(peticion)
+        num_entidades = capa.featureCount()
+        mensaje_seleccion = f"todas las {num_entidades} entidades"
+    
     try:
         # Parámetros por defecto
         if params is None:
@@ -46,10 +232,17 @@ def ejecutar(iface, params=None):
         distancia_inicial = params.get('distancia_inicial', 100)
         incremento = params.get('incremento', 100)
         num_anillos = params.get('num_anillos', 3)
+        tamano_lote = params.get('tamano_lote', 5000)
+        hilos = params.get('hilos', os.cpu_count() or 1)
+        segmentos = params.get('segmentos', 10)
+        tolerancia = params.get('tolerancia_simplificacion', 0)
+        disolver = params.get('disolver', False)
+        
+        distancias = [distancia_inicial + (incremento * i) for i in range(num_anillos)]
         
         # Crear capa de salida
-        crs = capa.crs().authid()
         nombre_capa = f"Buffers_{capa.name()}"
+        ruta_salida = params.get('output_path')
         
         # Definir campos
         campos = QgsFields()
@@ -57,47 +250,65 @@ def ejecutar(iface, params=None):
         campos.append(QgsField("distancia", QVariant.Double))
         campos.append(QgsField("anillo", QVariant.Int))
         
-        # Crear capa en memoria
-        capa_buffer = QgsVectorLayer(
-            f"Polygon?crs={crs}",
-            nombre_capa,
-            "memory"
-        )
+        escritor = None
+        if ruta_salida:
+            # Escribir directamente a disco (GeoPackage o FlatGeobuf)
+            escritor = _crear_escritor(ruta_salida, campos,
+                                       QgsWkbTypes.MultiPolygon, capa.crs())
+            escribir = escritor.addFeatures
+        else:
+            # Crear capa en memoria
+            capa_buffer = QgsVectorLayer(
+                f"Polygon?crs={capa.crs().authid()}",
+                nombre_capa,
+                "memory"
+            )
+            
+            proveedor = capa_buffer.dataProvider()
+            proveedor.addAttributes(campos)
+            capa_buffer.updateFields()
+            escribir = proveedor.addFeatures
         
-        proveedor = capa_buffer.dataProvider()
-        proveedor.addAttributes(campos)
-        capa_buffer.updateFields()
+        if disolver:
+            generar_resultados = _resultados_disueltos
+        else:
+            generar_resultados = _resultados_por_lotes
         
-        nuevas_entidades = []
+        # Procesar por lotes repartidos entre los hilos; cada bloque se
+        # escribe en la salida en cuanto termina
+        try:
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                for resultados in generar_resultados(pool, entidades, distancias,
+                                                     segmentos, tolerancia,
+                                                     tamano_lote, hilos):
+                    nuevas_entidades = []
+                    for fid, distancia, anillo, wkb in resultados:
+                        buffer = QgsGeometry()
+                        buffer.fromWkb(wkb)
+                        if ruta_salida:
+                            buffer.convertToMultiType()
+                        
+                        # Crear nueva entidad
+                        nueva_entidad = QgsFeature(campos)
+                        nueva_entidad.setGeometry(buffer)
+                        nueva_entidad.setAttributes([fid, distancia, anillo])
+                        nuevas_entidades.append(nueva_entidad)
+                    
+                    # Agregar entidades del bloque a la salida
+                    if not escribir(nuevas_entidades):
+                        raise IOError("No se pudieron escribir las entidades del lote")
+        finally:
+            # El archivo se cierra al destruir el escritor; el método
+            # enlazado 'escribir' también guarda una referencia a él
+            escribir = escritor = None
         
-        # Crear buffers para cada entidad y cada distancia
-        for entidad in entidades:
-            geom = entidad.geometry()
-            
-            for i in range(num_anillos):
-                distancia = distancia_inicial + (incremento * i)
-                
-                # Crear buffer
-                buffer = geom.buffer(distancia, 10)
-                
-                # Si no es el primer anillo, crear anillo (donut)
-                if i > 0:
-                    distancia_interior = distancia_inicial + (incremento * (i - 1))
-                    buffer_interior = geom.buffer(distancia_interior, 10)
-                    buffer = buffer.difference(buffer_interior)
-                
-                # Crear nueva entidad
-                nueva_entidad = QgsFeature()
-                nueva_entidad.setGeometry(buffer)
-                nueva_entidad.setAttributes([
-                    entidad.id(),
-                    distancia,
-                    i + 1
-                ])
-                nuevas_entidades.append(nueva_entidad)
-        
-        # Agregar entidades a la capa
-        proveedor.addFeatures(nuevas_entidades)
+        if ruta_salida:
+            # Cargar el archivo ya cerrado como capa
+            capa_buffer = QgsVectorLayer(ruta_salida, nombre_capa, "ogr")
+            if not capa_buffer.isValid():
+                raise IOError(f"No se pudo abrir la salida: {ruta_salida}")
+        else:
+            capa_buffer.updateExtents()
         
         # Agregar la capa al proyecto
         QgsProject.instance().addMapLayer(capa_buffer)
@@ -126,11 +337,16 @@ def ejecutar(iface, params=None):
         capa_buffer.setRenderer(renderer)
         capa_buffer.triggerRepaint()
         
-        return {
+        resultado = {
             "status": "ok",
             "mensaje": f"Creados {num_anillos} anillos de buffer para {mensaje_seleccion}\n" +
-                      f"Distancias: {distancia_inicial} a {distancia_inicial + (incremento * (num_anillos - 1))} metros"
+                      f"Distancias: {distancia_inicial} a {distancia_inicial + (incremento * (num_anillos - 1))} metros",
+            "features": num_entidades if num_entidades >= 0 else None
         }
+        if ruta_salida:
+            resultado["mensaje"] += f"\nGuardado en: {ruta_salida}"
+            resultado["file"] = ruta_salida
+        return resultado
         
     except Exception as e:
         return {
@@ -1,18 +1,340 @@
 """Categoriza una capa vectorial por valores únicos de un campo"""
 
-from qgis.core import (QgsProject, QgsCategorizedSymbolRenderer,
-                       QgsSymbol, QgsRendererCategory, QgsGraduatedSymbolRenderer,
-                       QgsClassificationRange, QgsGradientColorRamp)
+from qgis.core import (QgsCategorizedSymbolRenderer, QgsSymbol,
+                       QgsRendererCategory, QgsGraduatedSymbolRenderer,
+                       QgsGradientColorRamp, QgsFeatureRequest,
+                       QgsRendererRange, QgsClassificationJenks, QgsApplication)
+from qgis.PyQt.QtCore import QVariant
 from qgis.PyQt.QtGui import QColor
+from collections import Counter, OrderedDict
+import hashlib
+import json
+import math
+import os
 import random
 
+
+def _color_determinista(valor):
+    """Color visible derivado del hash del valor: igual en cada ejecución"""
+    resumen = hashlib.md5(repr(valor).encode("utf-8")).digest()
+    return QColor.fromHsv(
+        int.from_bytes(resumen[:2], "big") % 360,
+        120 + resumen[2] % 100,
+        160 + resumen[3] % 80
+    )
+
+
+# Archivos junto al de origen que también guardan datos de la capa
+_ARCHIVOS_ASOCIADOS = {".shp": (".dbf", ".shx", ".cpg")}
+
+
+def _archivos_origen(ruta):
+    """Archivo de origen y sus asociados (partes del shapefile, WAL de SQLite)"""
+    archivos = [ruta]
+    base, extension = os.path.splitext(ruta)
+    for asociado in _ARCHIVOS_ASOCIADOS.get(extension.lower(), ()):
+        for candidato in (base + asociado, base + asociado.upper()):
+            if os.path.isfile(candidato):
+                archivos.append(candidato)
+                break
+    if os.path.isfile(ruta + "-wal"):
+        archivos.append(ruta + "-wal")
+    return archivos
+
+
+def _marca_datos(capa):
+    """
+    Marca de cambio de los datos de la capa: fecha de modificación y tamaño
+    del archivo de origen y sus asociados (.dbf de los shapefiles, -wal de
+    GeoPackage). Devuelve None si la capa no es un archivo local o tiene
+    ediciones sin guardar, que no se reflejan en los archivos
+    """
+    if capa.isModified():
+        return None
+    ruta = capa.dataProvider().dataSourceUri().split('|')[0]
+    if not os.path.isfile(ruta):
+        return None
+    marcas = []
+    for archivo in _archivos_origen(ruta):
+        estado = os.stat(archivo)
+        marcas.append(f"{os.path.basename(archivo)}:{estado.st_mtime_ns}-{estado.st_size}")
+    return ";".join(marcas)
+
+
+def _ruta_cache(params):
+    return params.get('ruta_cache') or os.path.join(
+        QgsApplication.qgisSettingsDirPath(), "cache", "categorize_layer.json"
+    )
+
+
+def _clave_cache(capa, *partes):
+    """Clave de caché a partir de la fuente de la capa y las opciones"""
+    texto = "|".join([capa.providerType(), capa.source()] + [str(p) for p in partes])
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def _cargar_cache(params):
+    try:
+        with open(_ruta_cache(params), encoding="utf-8") as archivo:
+            return json.load(archivo, object_pairs_hook=OrderedDict)
+    except (OSError, ValueError):
+        return OrderedDict()
+
+
+def _escribir_cache(params, cache):
+    try:
+        contenido = json.dumps(cache)
+    except TypeError:
+        return  # Valores que no se pueden guardar en JSON (fechas, etc.)
+    
+    ruta = _ruta_cache(params)
+    carpeta = os.path.dirname(ruta)
+    if carpeta and not os.path.exists(carpeta):
+        os.makedirs(carpeta)
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write(contenido)
+
+
+def _leer_cache(params, clave, marca):
+    """
+    Devuelve la simbología guardada si la marca de datos coincide y la
+    marca como la entrada usada más recientemente
+    """
+    if marca is None or not params.get('usar_cache', True):
+        return None
+    cache = _cargar_cache(params)
+    entrada = cache.get(clave)
+    if not entrada or entrada.get("marca") != marca:
+        return None
+    cache.move_to_end(clave)
+    _escribir_cache(params, cache)
+    return entrada["clases"]
+
+
+def _guardar_cache(params, clave, marca, clases):
+    """
+    Guarda la simbología calculada como entrada más reciente y elimina las
+    menos usadas por encima de 'cache_max_entradas'
+    """
+    if marca is None or not params.get('usar_cache', True):
+        return
+    cache = _cargar_cache(params)
+    cache.pop(clave, None)
+    cache[clave] = {"marca": marca, "clases": clases}
+    while len(cache) > params.get('cache_max_entradas', 200):
+        cache.popitem(last=False)
+    _escribir_cache(params, cache)
+
+
+def _estimar_cardinalidad(capa, indice_campo, tamano_muestra):
+    """
+    Cuenta los valores distintos de un campo en las primeras
+    'tamano_muestra' entidades y estima el total de la capa
+    
+    Devuelve (distintos en la muestra, estimación). La estimación usa el
+    estimador GEE: sqrt(N/n)·f1 + Σ fj (j ≥ 2), donde fj es el número de
+    valores que aparecen j veces en la muestra.
+    """
+    peticion = QgsFeatureRequest()
+    peticion.setFlags(QgsFeatureRequest.NoGeometry)
+    peticion.setSubsetOfAttributes([indice_campo])
+    peticion.setLimit(tamano_muestra)
+    
+    frecuencias = Counter(entidad.attributes()[indice_campo]
+                          for entidad in capa.getFeatures(peticion))
+    n = sum(frecuencias.values())
+    if n == 0:
+        return 0, 0
+    
+    total = max(capa.featureCount(), n)
+    unicos = sum(1 for veces in frecuencias.values() if veces == 1)
+    repetidos = len(frecuencias) - unicos
+    return len(frecuencias), int(math.sqrt(total / n) * unicos + repetidos)
+
+
+class _SketchCuantiles:
+    """
+    Sketch de cuantiles por compactadores (familia KLL) con memoria
+    O(k·log(n/k))
+    
+    Cada nivel guarda como máximo 'k' valores; al llenarse se ordena y
+    se promueve al nivel siguiente uno de cada dos valores, que pasa a
+    pesar el doble. Dos sketches se pueden fusionar sumando sus niveles.
+    """
+    
+    def __init__(self, k=512, semilla=0):
+        self.k = k
+        self.niveles = [[]]
+        self._aleatorio = random.Random(semilla)
+    
+    def agregar(self, valor):
+        self.niveles[0].append(valor)
+        if len(self.niveles[0]) >= self.k:
+            self._compactar(0)
+    
+    def fusionar(self, otro):
+        """Incorpora los valores de otro sketch"""
+        while len(self.niveles) < len(otro.niveles):
+            self.niveles.append([])
+        for nivel, valores in enumerate(otro.niveles):
+            self.niveles[nivel].extend(valores)
+        for nivel in range(len(self.niveles)):
+            if len(self.niveles[nivel]) >= self.k:
+                self._compactar(nivel)
+    
+    def _compactar(self, nivel):
+        elementos = sorted(self.niveles[nivel])
+        
+        # Con un número impar de valores uno queda en el nivel
+        resto = []
+        if len(elementos) % 2:
+            resto = [elementos.pop(self._aleatorio.randrange(len(elementos)))]
+        
+        if nivel + 1 == len(self.niveles):
+            self.niveles.append([])
+        self.niveles[nivel + 1].extend(elementos[self._aleatorio.randint(0, 1)::2])
+        self.niveles[nivel] = resto
+        
+        if len(self.niveles[nivel + 1]) >= self.k:
+            self._compactar(nivel + 1)
+    
+    def cuantiles(self, probabilidades):
+        """Devuelve el valor aproximado de cada probabilidad (0 a 1)"""
+        ponderados = sorted((valor, 2 ** nivel)
+                            for nivel, valores in enumerate(self.niveles)
+                            for valor in valores)
+        total = sum(peso for _, peso in ponderados)
+        
+        resultado = []
+        acumulado = 0
+        posicion = 0
+        for probabilidad in sorted(probabilidades):
+            objetivo = probabilidad * total
+            while posicion < len(ponderados) - 1 and acumulado + ponderados[posicion][1] < objetivo:
+                acumulado += ponderados[posicion][1]
+                posicion += 1
+            resultado.append(ponderados[posicion][0])
+        return resultado
+
+
+def _leer_valores_numericos(capa, indice_campo, tamano_muestra):
+    """
+    Recorre una vez el campo numérico y devuelve (mínimo, máximo, sketch de
+    cuantiles, muestra aleatoria de hasta 'tamano_muestra' valores)
+    """
+    peticion = QgsFeatureRequest()
+    peticion.setFlags(QgsFeatureRequest.NoGeometry)
+    peticion.setSubsetOfAttributes([indice_campo])
+    
+    sketch = _SketchCuantiles()
+    aleatorio = random.Random(0)
+    muestra = []
+    minimo = maximo = None
+    n = 0
+    
+    for entidad in capa.getFeatures(peticion):
+        valor = entidad.attributes()[indice_campo]
+        if valor is None or (isinstance(valor, QVariant) and valor.isNull()):
+            continue
+        valor = float(valor)
+        
+        minimo = valor if minimo is None else min(minimo, valor)
+        maximo = valor if maximo is None else max(maximo, valor)
+        sketch.agregar(valor)
+        
+        # Muestreo por reservorio para Jenks
+        n += 1
+        if len(muestra) < tamano_muestra:
+            muestra.append(valor)
+        else:
+            posicion = aleatorio.randrange(n)
+            if posicion < tamano_muestra:
+                muestra[posicion] = valor
+    
+    return minimo, maximo, sketch, muestra
+
+
+def _aplicar_graduado(iface, capa, campo, params):
+    """Aplica simbología graduada a un campo numérico en una sola pasada"""
+    metodo = params.get('metodo', 'cuantiles')
+    num_clases = params.get('clases', 5)
+    
+    if metodo not in ('cuantiles', 'intervalos', 'jenks'):
+        return {
+            "status": "error",
+            "mensaje": f"Método no soportado: '{metodo}' (use cuantiles, intervalos o jenks)"
+        }
+    
+    clave = _clave_cache(capa, campo, 'graduado', metodo, num_clases)
+    marca = _marca_datos(capa)
+    clases = _leer_cache(params, clave, marca)
+    
+    if clases is None:
+        indice_campo = capa.fields().indexOf(campo)
+        minimo, maximo, sketch, muestra = _leer_valores_numericos(
+            capa, indice_campo, params.get('tamano_muestra_jenks', 5000)
+        )
+        if minimo is None:
+            return {
+                "status": "warning",
+                "mensaje": f"El campo '{campo}' no tiene valores"
+            }
+        
+        # Calcular los cortes entre clases
+        if metodo == 'intervalos':
+            paso = (maximo - minimo) / num_clases
+            cortes = [minimo + paso * i for i in range(1, num_clases)]
+        elif metodo == 'cuantiles':
+            cortes = sketch.cuantiles([i / num_clases for i in range(1, num_clases)])
+        else:
+            rangos_jenks = QgsClassificationJenks().classes(muestra, num_clases)
+            cortes = [rango.upperBound() for rango in rangos_jenks[:-1]]
+        limites = [minimo] + sorted(set(c for c in cortes if minimo < c < maximo)) + [maximo]
+        
+        # Colores de una rampa
+        rampa = QgsGradientColorRamp(QColor(255, 255, 204), QColor(189, 0, 38))
+        num_rangos = len(limites) - 1
+        clases = []
+        for i in range(num_rangos):
+            inferior, superior = limites[i], limites[i + 1]
+            color = rampa.color(i / (num_rangos - 1) if num_rangos > 1 else 0)
+            clases.append([inferior, superior, f"{inferior:g} - {superior:g}", color.name()])
+        
+        _guardar_cache(params, clave, marca, clases)
+    
+    # Crear rangos
+    rangos = []
+    for inferior, superior, etiqueta, color in clases:
+        simbolo = QgsSymbol.defaultSymbol(capa.geometryType())
+        simbolo.setColor(QColor(color))
+        rangos.append(QgsRendererRange(inferior, superior, simbolo, etiqueta))
+    
+    # Crear y aplicar el renderer
+    renderer = QgsGraduatedSymbolRenderer(campo, rangos)
+    capa.setRenderer(renderer)
+    
+    # Refrescar la capa
+    capa.triggerRepaint()
+    iface.layerTreeView().refreshLayerSymbology(capa.id())
+    
+    return {
+        "status": "ok",
+        "mensaje": f"Capa graduada por '{campo}' ({len(rangos)} clases, método {metodo})"
+    }
+
+
 def ejecutar(iface, params=None):
     """
     Aplica simbología categorizada a la capa activa
     
     Args:
         iface: Interfaz de QGIS
-        params: Diccionario con 'campo' para categorizar
+        params: Diccionario con 'campo' para categorizar y opcionalmente
+                'max_categorias' y 'tamano_muestra'. Con 'modo': 'graduado'
+                clasifica un campo numérico ('metodo' cuantiles, intervalos
+                o jenks; 'clases'; 'tamano_muestra_jenks'). La simbología de
+                capas de archivo se guarda en caché ('usar_cache',
+                'ruta_cache', 'cache_max_entradas')
     
     Returns:
         dict: Estado y mensaje del resultado
@@ -34,9 +356,21 @@ def ejecutar(iface, params=None):
         }
     
     try:
+        graduado = bool(params) and params.get('modo') == 'graduado'
+        
         # Obtener campo para categorizar
         if params and 'campo' in params:
             campo = params['campo']
+        elif graduado:
+            # Usar el primer campo numérico si no se especifica
+            campos_numericos = [field.name() for field in capa.fields()
+                                if field.isNumeric()]
+            if not campos_numericos:
+                return {
+                    "status": "error",
+                    "mensaje": "La capa no tiene campos numéricos para graduar"
+                }
+            campo = campos_numericos[0]
         else:
             # Usar el primer campo de texto si no se especifica
             campos_texto = [field.name() for field in capa.fields() 
@@ -55,31 +389,59 @@ def ejecutar(iface, params=None):
                 "mensaje": f"El campo '{campo}' no existe en la capa"
             }
         
-        # Obtener valores únicos
-        valores_unicos = capa.uniqueValues(capa.fields().indexOf(campo))
+        if graduado:
+            if not capa.fields().field(campo).isNumeric():
+                return {
+                    "status": "error",
+                    "mensaje": f"El campo '{campo}' no es numérico"
+                }
+            return _aplicar_graduado(iface, capa, campo, params)
         
-        if len(valores_unicos) > 50:
-            return {
-                "status": "warning",
-                "mensaje": f"Demasiadas categorías ({len(valores_unicos)}). Máximo recomendado: 50"
-            }
+        params = params or {}
+        indice_campo = capa.fields().indexOf(campo)
+        max_categorias = params.get('max_categorias', 50)
         
-        # Crear categorías con colores aleatorios
-        categorias = []
-        for valor in sorted(valores_unicos):
-            # Generar color aleatorio pero visible
-            color = QColor(
-                random.randint(50, 200),
-                random.randint(50, 200),
-                random.randint(50, 200)
+        # Reutilizar las categorías si los datos no cambiaron
+        clave = _clave_cache(capa, campo, 'categorias', max_categorias)
+        marca = _marca_datos(capa)
+        clases = _leer_cache(params, clave, marca)
+        
+        if clases is None:
+            # Muestra rápida: si ya supera el máximo se avisa sin recorrer la capa
+            distintos, estimacion = _estimar_cardinalidad(
+                capa, indice_campo, params.get('tamano_muestra', 10000)
             )
+            if distintos > max_categorias:
+                return {
+                    "status": "warning",
+                    "mensaje": f"Demasiadas categorías (~{estimacion} estimadas). Máximo recomendado: {max_categorias}"
+                }
+            
+            # Obtener valores únicos, deteniendo la búsqueda al superar el máximo
+            # (el proveedor aplica el límite cuando lo soporta)
+            valores_unicos = capa.uniqueValues(indice_campo, max_categorias + 1)
+            
+            if len(valores_unicos) > max_categorias:
+                return {
+                    "status": "warning",
+                    "mensaje": f"Demasiadas categorías (más de {max_categorias}). Máximo recomendado: {max_categorias}"
+                }
+            
+            # Colores deterministas: el mismo valor tiene siempre el mismo color
+            clases = []
+            for valor in sorted(valores_unicos):
+                # Manejar valores nulos
+                etiqueta = str(valor) if valor is not None else "Sin valor"
+                clases.append([valor, etiqueta, _color_determinista(valor).name()])
             
+            _guardar_cache(params, clave, marca, clases)
+        
+        # Crear categorías
+        categorias = []
+        for valor, etiqueta, color in clases:
             # Crear símbolo según el tipo de geometría
             simbolo = QgsSymbol.defaultSymbol(capa.geometryType())
-            simbolo.setColor(color)
-            
-            # Manejar valores nulos
-            etiqueta = str(valor) if valor is not None else "Sin valor"
+            simbolo.setColor(QColor(color))
             
             # Crear categoría
             categoria = QgsRendererCategory(valor, simbolo, etiqueta)
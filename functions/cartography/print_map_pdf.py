@@ -1,16 +1,377 @@
 """Print the current map using the first available layout"""
 
-from qgis.core import QgsProject, QgsLayoutExporter
+from qgis.core import (QgsProject, QgsLayoutExporter, QgsApplication,
+                       QgsUnitTypes, QgsLayoutItemMap, QgsReadWriteContext,
+                       QgsVectorLayer)
+from qgis.PyQt.QtCore import QRectF, QSize, QSizeF, QMarginsF
+from qgis.PyQt.QtGui import QPainter, QPdfWriter, QPageSize
+from qgis.PyQt.QtXml import QDomDocument
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import math
 import os
+import re
+import shutil
+import time
 from datetime import datetime
 
+# Names of the qgis_process launcher on the different platforms
+_QGIS_PROCESS_NAMES = ["qgis_process", "qgis_process.exe",
+                       "qgis_process-qgis.bat", "qgis_process-qgis-ltr.bat"]
+
+_ERRORS = {
+    QgsLayoutExporter.MemoryError: "Memory error",
+    QgsLayoutExporter.FileError: "File error",
+    QgsLayoutExporter.PrintError: "Print error",
+    QgsLayoutExporter.SvgLayerError: "SVG layer error",
+    QgsLayoutExporter.Canceled: "Export canceled"
+}
+
+
+def _find_qgis_process():
+    """Locate the qgis_process command line tool, or return None"""
+    for name in _QGIS_PROCESS_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    
+    bin_folder = os.path.join(QgsApplication.prefixPath(), "bin")
+    for name in _QGIS_PROCESS_NAMES:
+        path = os.path.join(bin_folder, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _output_path(output_folder, layout_name, atlas, timestamp, taken):
+    """
+    Build the PDF path for a layout. Different names can become the same
+    once unsafe characters are replaced ("Map 1", "Map_1"), so a number is
+    appended when the path is already in 'taken' or on disk
+    """
+    safe_name = re.sub(r'[^\w\-]+', '_', layout_name)
+    prefix = "atlas" if atlas else "map"
+    base = os.path.join(output_folder, f"{prefix}_{safe_name}_{timestamp}")
+    path = f"{base}.pdf"
+    number = 1
+    while path in taken or os.path.exists(path):
+        number += 1
+        path = f"{base}_{number}.pdf"
+    taken.add(path)
+    return path
+
+
+def _page_geometry(layout, page, dpi):
+    """Return the page rectangle in layout units and its size in pixels"""
+    size = layout.convertToLayoutUnits(page.pageSize())
+    rect = QRectF(page.pos().x(), page.pos().y(), size.width(), size.height())
+    size_mm = layout.renderContext().measurementConverter().convert(
+        page.pageSize(), QgsUnitTypes.LayoutMillimeters
+    )
+    width_px = int(math.ceil(size_mm.width() / 25.4 * dpi))
+    height_px = int(math.ceil(size_mm.height() / 25.4 * dpi))
+    return rect, size_mm, width_px, height_px
+
+
+def _export_tiled(layout, output_path, dpi, memory_limit_mb):
+    """
+    Render each page in horizontal strips that fit in 'memory_limit_mb' and
+    assemble them in a PDF
+    
+    Whole pages are rasterized at 'dpi', vector layers, text and labels
+    included; only one strip is held in memory at a time.
+    """
+    exporter = QgsLayoutExporter(layout)
+    pages = layout.pageCollection()
+    writer = QPdfWriter(output_path)
+    writer.setResolution(dpi)
+    writer.setPageMargins(QMarginsF(0, 0, 0, 0))
+    painter = None
+    
+    try:
+        for index in range(pages.pageCount()):
+            rect, size_mm, width_px, height_px = _page_geometry(layout, pages.page(index), dpi)
+            writer.setPageSize(QPageSize(QSizeF(size_mm.width(), size_mm.height()),
+                                         QPageSize.Millimeter))
+            if painter is None:
+                painter = QPainter(writer)
+            else:
+                writer.newPage()
+            
+            # Strip height in pixels so that one strip fits in the memory limit
+            strip_px = max(1, int(memory_limit_mb * 1024 * 1024 // (width_px * 4)))
+            strip_count = int(math.ceil(height_px / strip_px))
+            
+            for strip in range(strip_count):
+                top_px = strip * strip_px
+                rows = min(strip_px, height_px - top_px)
+                region = QRectF(rect.x(),
+                                rect.y() + rect.height() * top_px / height_px,
+                                rect.width(),
+                                rect.height() * rows / height_px)
+                image = exporter.renderRegionToImage(region, QSize(width_px, rows), dpi)
+                if image.isNull():
+                    return QgsLayoutExporter.MemoryError
+                painter.drawImage(QRectF(0, top_px, width_px, rows), image)
+                del image
+    finally:
+        if painter is not None:
+            painter.end()
+    
+    return QgsLayoutExporter.Success
+
+
+def _map_layers(project, item):
+    """Layers rendered by a map item, in drawing order"""
+    if item.followVisibilityPreset():
+        return project.mapThemeCollection().mapThemeVisibleLayers(
+            item.followVisibilityPresetName())
+    if item.keepLayerSet():
+        return item.layers()
+    checked = set(layer.id() for layer in project.layerTreeRoot().checkedLayers())
+    return [layer for layer in project.layerTreeRoot().layerOrder()
+            if layer.id() in checked]
+
+
+# Files next to the main source whose changes also change the rendering
+_SIDECARS = {".shp": (".dbf", ".shx", ".prj", ".cpg")}
+
+
+def _source_files(path):
+    """Main source file plus its sidecars (shapefile parts, SQLite WAL)"""
+    files = [path]
+    stem, extension = os.path.splitext(path)
+    for sidecar in _SIDECARS.get(extension.lower(), ()):
+        for candidate in (stem + sidecar, stem + sidecar.upper()):
+            if os.path.isfile(candidate):
+                files.append(candidate)
+                break
+    if os.path.isfile(path + "-wal"):
+        files.append(path + "-wal")
+    return files
+
+
+def _layer_stamp(layer):
+    """Modification stamp of a layer's source files, or None if not local files"""
+    path = layer.source().split('|')[0]
+    if not os.path.isfile(path):
+        return None
+    stamps = []
+    for source_file in _source_files(path):
+        status = os.stat(source_file)
+        stamps.append(f"{os.path.basename(source_file)}:{status.st_mtime_ns}-{status.st_size}")
+    return ";".join(stamps)
+
+
+def _layer_style(layer):
+    """Style of a layer as XML: symbology, labels and rendering settings"""
+    document = QDomDocument()
+    layer.exportNamedStyle(document)
+    return bytes(document.toByteArray())
+
+
+def _layout_fingerprint(project, layout, settings, params):
+    """
+    Hash of the layout XML, the export settings and, for each map item, its
+    layers in drawing order with their styles and modification stamps
+    
+    Returns None when a layer has uncommitted edits, or when a layer has no
+    stamp (database or web layers) unless 'cache_trust_remote_layers' is set,
+    since their changes cannot be detected.
+    """
+    document = QDomDocument()
+    document.appendChild(layout.writeXml(document, QgsReadWriteContext()))
+    
+    digest = hashlib.sha256(bytes(document.toByteArray()))
+    digest.update(f"{settings.dpi}|{params.get('large_format', 'auto')}|"
+                  f"{params.get('memory_limit_mb', 1024)}".encode("utf-8"))
+    
+    styles = {}
+    for item in layout.items():
+        if not isinstance(item, QgsLayoutItemMap):
+            continue
+        digest.update(f"map|{item.uuid()}".encode("utf-8"))
+        for layer in _map_layers(project, item):
+            if isinstance(layer, QgsVectorLayer) and layer.isModified():
+                return None
+            stamp = _layer_stamp(layer)
+            if stamp is None:
+                if not params.get('cache_trust_remote_layers', False):
+                    return None
+                stamp = layer.source()
+            digest.update(f"{layer.id()}|{stamp}".encode("utf-8"))
+            if layer.id() not in styles:
+                styles[layer.id()] = _layer_style(layer)
+            digest.update(styles[layer.id()])
+    return digest.hexdigest()
+
+
+def _cache_folder(params):
+    folder = params.get('cache_folder') or os.path.join(
+        QgsApplication.qgisSettingsDirPath(), "cache", "print_map_pdf"
+    )
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return folder
+
+
+def _store_in_cache(params, fingerprint, output_path):
+    """
+    Copy an exported PDF into the cache and apply the retention limits
+    ('cache_max_files' newest files, none older than 'cache_max_age_days')
+    """
+    folder = _cache_folder(params)
+    shutil.copyfile(output_path, os.path.join(folder, f"{fingerprint}.pdf"))
+    
+    cached = sorted(
+        (os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".pdf")),
+        key=os.path.getmtime, reverse=True
+    )
+    oldest_allowed = time.time() - params.get('cache_max_age_days', 30) * 86400
+    for index, path in enumerate(cached):
+        if index >= params.get('cache_max_files', 50) or os.path.getmtime(path) < oldest_allowed:
+            os.remove(path)
+
+
+def _export_layout(layout, output_path, settings, params):
+    """
+    Export a layout to PDF. The vector export is tried first; tiled
+    rendering, which rasterizes whole pages, is used when requested with
+    'large_format' True or, with "auto", when the vector export runs out
+    of memory. Returns (result, tiled)
+    """
+    large_format = params.get('large_format', 'auto')
+    memory_limit_mb = params.get('memory_limit_mb', 1024)
+    
+    if large_format is True:
+        return _export_tiled(layout, output_path, settings.dpi, memory_limit_mb), True
+    
+    result = QgsLayoutExporter(layout).exportToPdf(output_path, settings)
+    if result == QgsLayoutExporter.MemoryError and large_format == 'auto':
+        return _export_tiled(layout, output_path, settings.dpi, memory_limit_mb), True
+    return result, False
+
+
+def _export_in_process(layout, atlas, output_path, settings, params):
+    """Export one layout (or its atlas) in the current QGIS session"""
+    start = time.perf_counter()
+    if atlas:
+        result, error = QgsLayoutExporter.exportToPdf(layout.atlas(), output_path, settings)
+    else:
+        result, _ = _export_layout(layout, output_path, settings, params)
+        error = ""
+    elapsed = time.perf_counter() - start
+    
+    if result == QgsLayoutExporter.Success:
+        return output_path, elapsed, None
+    return None, elapsed, error or _ERRORS.get(result, "Unknown error")
+
+
+def _export_with_process(qgis_process, project_path, layout_name, atlas,
+                         output_path, dpi):
+    """
+    Export one layout (or its atlas) in a separate qgis_process run, which
+    loads its own copy of the project
+    """
+    import subprocess
+    
+    algorithm = "native:atlaslayouttopdf" if atlas else "native:printlayouttopdf"
+    command = [
+        qgis_process, "run", algorithm,
+        f"--PROJECT_PATH={project_path}",
+        f"--LAYOUT={layout_name}",
+        f"--DPI={dpi}",
+        "--SIMPLIFY=true",
+        "--INCLUDE_METADATA=true",
+        f"--OUTPUT={output_path}"
+    ]
+    
+    start = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    
+    if completed.returncode == 0 and os.path.exists(output_path):
+        return output_path, elapsed, None
+    lines = (completed.stderr or completed.stdout).strip().splitlines()
+    return None, elapsed, lines[-1] if lines else f"exit code {completed.returncode}"
+
+
+def _export_batch(project, layouts, params, output_folder, settings):
+    """
+    Export several layouts concurrently, each in its own qgis_process run
+    
+    Falls back to exporting one after another in the current session when
+    qgis_process is not available or the project has not been saved.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    use_atlas = params.get('atlas', False)
+    jobs = []
+    taken = set()
+    for layout in layouts:
+        atlas = use_atlas and layout.atlas().enabled()
+        jobs.append((layout, atlas, _output_path(output_folder, layout.name(), atlas,
+                                                 timestamp, taken)))
+    
+    qgis_process = _find_qgis_process()
+    project_path = project.fileName()
+    notes = []
+    
+    if qgis_process and project_path:
+        if project.isDirty():
+            notes.append("Unsaved project changes are not included in the export")
+        
+        workers = params.get('workers', os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_export_with_process, qgis_process, project_path,
+                            layout.name(), atlas, output_path, settings.dpi)
+                for layout, atlas, output_path in jobs
+            ]
+            results = [future.result() for future in futures]
+    else:
+        notes.append("qgis_process or a saved project is not available: "
+                     "layouts were exported one after another")
+        results = [_export_in_process(layout, atlas, output_path, settings, params)
+                   for layout, atlas, output_path in jobs]
+    
+    files = []
+    timings = {}
+    failures = []
+    lines = []
+    for (layout, atlas, _), (output_path, elapsed, error) in zip(jobs, results):
+        timings[layout.name()] = round(elapsed, 2)
+        if output_path:
+            files.append(output_path)
+            lines.append(f"✓ {layout.name()} ({elapsed:.1f} s)")
+        else:
+            failures.append(layout.name())
+            lines.append(f"✗ {layout.name()} ({elapsed:.1f} s): {error}")
+    
+    message = f"Exported {len(files)} of {len(jobs)} layouts to:\n{output_folder}\n\n"
+    message += "\n".join(lines + notes)
+    
+    return {
+        "status": "ok" if not failures else ("warning" if files else "error"),
+        "message": message,
+        "files": files,
+        "timings": timings
+    }
+
 def execute(iface, params=None):
     """
     Export the current map to PDF using the first available layout
     
     Args:
         iface: QGIS interface
-        params: Optional parameters (layout_name, output_folder, dpi)
+        params: Optional parameters (layout_name, output_folder, dpi).
+                For batch export, 'layouts' takes a list of layout names
+                or "all"; 'atlas' exports the atlas of layouts that have
+                one, and 'workers' limits the concurrent exports.
+                'large_format' True rasterizes whole pages in tiles under
+                'memory_limit_mb' (MB); "auto" (default) does so only if
+                the vector export runs out of memory. Unchanged layouts reuse
+                a cached PDF ('use_cache', 'cache_folder', 'cache_max_files',
+                'cache_max_age_days', 'cache_trust_remote_layers')
     
     Returns:
         dict: Status and result message
@@ -29,6 +390,37 @@ def execute(iface, params=None):
             "message": "No layouts available in the project"
         }
     
+    # Batch export of several layouts
+    batch = params.get('layouts')
+    if batch:
+        if batch == "all":
+            selected = layouts
+        else:
+            selected = [manager.layoutByName(name) for name in batch]
+            missing = [name for name, layout in zip(batch, selected) if not layout]
+            if missing:
+                return {
+                    "status": "error",
+                    "message": f"Layouts not found: {', '.join(missing)}"
+                }
+        
+        try:
+            output_folder = params.get('output_folder', os.path.expanduser("~/Desktop"))
+            if not os.path.exists(output_folder):
+                os.makedirs(output_folder)
+            
+            settings = QgsLayoutExporter.PdfExportSettings()
+            settings.dpi = params.get('dpi', 300)
+            settings.exportMetadata = True
+            settings.simplifyGeometries = True
+            
+            return _export_batch(project, selected, params, output_folder, settings)
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Error exporting layouts: {str(e)}"
+            }
+    
     # Select layout
     layout_name = params.get('layout_name')
     if layout_name:
@@ -42,17 +434,13 @@ def execute(iface, params=None):
         layout = layouts[0]
     
     try:
-        # Configure exporter
-        exporter = QgsLayoutExporter(layout)
-        
         # Configure output path
         output_folder = params.get('output_folder', os.path.expanduser("~/Desktop"))
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"map_{layout.name()}_{timestamp}.pdf"
-        output_path = os.path.join(output_folder, filename)
+        output_path = _output_path(output_folder, layout.name(), False, timestamp, set())
         
         # Configure export settings
         settings = QgsLayoutExporter.PdfExportSettings()
@@ -60,24 +448,36 @@ def execute(iface, params=None):
         settings.exportMetadata = True
         settings.simplifyGeometries = True
         
-        # Export
-        result = exporter.exportToPdf(output_path, settings)
+        # Reuse a previous export when nothing has changed
+        fingerprint = None
+        if params.get('use_cache', True):
+            fingerprint = _layout_fingerprint(project, layout, settings, params)
+        if fingerprint:
+            cached_path = os.path.join(_cache_folder(params), f"{fingerprint}.pdf")
+            if os.path.exists(cached_path):
+                os.utime(cached_path)
+                return {
+                    "status": "ok",
+                    "message": f"Layout unchanged, reusing previous export:\n{cached_path}",
+                    "file": cached_path
+                }
+        
+        # Export (tiled for large formats)
+        result, tiled = _export_layout(layout, output_path, settings, params)
         
         if result == QgsLayoutExporter.Success:
+            message = f"Map successfully exported to:\n{output_path}"
+            if tiled:
+                message += "\n(pages rasterized in tiles to stay within the memory limit)"
+            if fingerprint:
+                _store_in_cache(params, fingerprint, output_path)
             return {
                 "status": "ok",
-                "message": f"Map successfully exported to:\n{output_path}",
+                "message": message,
                 "file": output_path
             }
         else:
-            errors = {
-                QgsLayoutExporter.MemoryError: "Memory error",
-                QgsLayoutExporter.FileError: "File error",
-                QgsLayoutExporter.PrintError: "Print error",
-                QgsLayoutExporter.SvgLayerError: "SVG layer error",
-                QgsLayoutExporter.Canceled: "Export canceled"
-            }
-            error_message = errors.get(result, "Unknown error")
+            error_message = _ERRORS.get(result, "Unknown error")
             return {
                 "status": "error",
                 "message": f"Export error: {error_message}"
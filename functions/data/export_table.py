@@ -0,0 +1,217 @@
+"""Exporta los atributos de la capa activa a CSV, Parquet o Arrow"""
+
+from qgis.core import QgsFeatureRequest
+from qgis.PyQt.QtCore import QVariant
+import csv
+import os
+from datetime import datetime
+
+# Extensión de archivo de cada formato
+_EXTENSIONES = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _valor_nativo(valor):
+    """Convierte un valor de atributo de QGIS a un tipo nativo de Python"""
+    if valor is None or (isinstance(valor, QVariant) and valor.isNull()):
+        return None
+    if hasattr(valor, 'toPyDateTime'):  # QDateTime
+        return valor.toPyDateTime()
+    if hasattr(valor, 'toPyDate'):  # QDate
+        return valor.toPyDate()
+    if hasattr(valor, 'toPyTime'):  # QTime
+        return valor.toPyTime()
+    return valor
+
+
+def _leer_filas(entidades, indices):
+    """Genera las filas de valores nativos en el orden de 'indices'"""
+    for entidad in entidades:
+        atributos = entidad.attributes()
+        yield [_valor_nativo(atributos[indice]) for indice in indices]
+
+
+def _tipo_arrow(pa, campo):
+    """Tipo de columna Arrow equivalente al tipo del campo de QGIS"""
+    tipos = {
+        QVariant.Bool: pa.bool_(),
+        QVariant.Int: pa.int32(),
+        QVariant.UInt: pa.uint32(),
+        QVariant.LongLong: pa.int64(),
+        QVariant.ULongLong: pa.uint64(),
+        QVariant.Double: pa.float64(),
+        QVariant.Date: pa.date32(),
+        QVariant.Time: pa.time64('us'),
+        QVariant.DateTime: pa.timestamp('ms'),
+    }
+    return tipos.get(campo.type(), pa.string())
+
+
+def _escribir_csv(archivo_salida, nombres_campos, filas):
+    """Escribe las filas en CSV a medida que llegan"""
+    with open(archivo_salida, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(nombres_campos)
+        for fila in filas:
+            escritor.writerow(
+                ["" if valor is None else
+                 valor.isoformat() if hasattr(valor, 'isoformat') else valor
+                 for valor in fila]
+            )
+
+
+def _escribir_arrow(archivo_salida, formato, esquema, filas, tamano_lote):
+    """Escribe las filas en Parquet o Arrow IPC por lotes de registros"""
+    import pyarrow as pa
+    
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        escritor = pq.ParquetWriter(archivo_salida, esquema)
+    else:
+        escritor = pa.ipc.new_file(archivo_salida, esquema)
+    
+    def volcar(columnas):
+        arrays = []
+        for valores, campo in zip(columnas, esquema):
+            if not pa.types.is_string(campo.type):
+                arrays.append(pa.array(valores, type=campo.type))
+            else:
+                arrays.append(pa.array(
+                    [None if valor is None else str(valor) for valor in valores],
+                    type=campo.type
+                ))
+        escritor.write_batch(pa.RecordBatch.from_arrays(arrays, schema=esquema))
+    
+    columnas = [[] for _ in esquema]
+    try:
+        for fila in filas:
+            for columna, valor in zip(columnas, fila):
+                columna.append(valor)
+            if len(columnas[0]) >= tamano_lote:
+                volcar(columnas)
+                columnas = [[] for _ in esquema]
+        
+        if columnas and columnas[0]:
+            volcar(columnas)
+    finally:
+        escritor.close()
+
+
+def ejecutar(iface, params=None):
+    """
+    Exporta la tabla de atributos de la capa activa a un formato columnar
+    
+    Args:
+        iface: Interfaz de QGIS
+        params: Parámetros opcionales ('formato' csv/parquet/arrow,
+                'output_path', 'campos' con la lista de campos a exportar,
+                'tamano_lote' filas por lote de registros)
+    
+    Returns:
+        dict: Estado y mensaje del resultado
+    """
+    if params is None:
+        params = {}
+    
+    formato = params.get('formato', 'csv').lower()
+    if formato not in _EXTENSIONES:
+        return {
+            "status": "error",
+            "mensaje": f"Formato no soportado: '{formato}' (use csv, parquet o arrow)"
+        }
+    
+    # Verificar que pyarrow está disponible para Parquet y Arrow
+    if formato != "csv":
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return {
+                "status": "error",
+                "mensaje": "Necesita instalar pyarrow:\npip install pyarrow"
+            }
+    
+    capa = iface.activeLayer()
+    
+    if not capa:
+        return {
+            "status": "warning",
+            "mensaje": "Seleccione una capa para exportar"
+        }
+    
+    if capa.type() != 0:  # 0 = Vector Layer
+        return {
+            "status": "error",
+            "mensaje": "Solo se pueden exportar capas vectoriales"
+        }
+    
+    try:
+        # Determinar archivo de salida
+        if 'output_path' in params:
+            archivo_salida = params['output_path']
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            nombre_sugerido = f"{capa.name()}_{timestamp}{_EXTENSIONES[formato]}"
+            archivo_salida = os.path.join(
+                os.path.expanduser("~/Desktop"),
+                nombre_sugerido
+            )
+        
+        # Obtener campos (todos o los indicados en 'campos')
+        campos = capa.fields()
+        if params.get('campos'):
+            nombres_campos = list(params['campos'])
+            inexistentes = [nombre for nombre in nombres_campos
+                            if campos.indexOf(nombre) < 0]
+            if inexistentes:
+                return {
+                    "status": "error",
+                    "mensaje": f"Campos inexistentes en la capa: {', '.join(inexistentes)}"
+                }
+        else:
+            nombres_campos = [campo.name() for campo in campos]
+        indices = [campos.indexOf(nombre) for nombre in nombres_campos]
+        
+        # Obtener entidades (seleccionadas o todas) sin geometría y solo
+        # con los atributos exportados
+        peticion = QgsFeatureRequest()
+        peticion.setFlags(QgsFeatureRequest.NoGeometry)
+        peticion.setSubsetOfAttributes(indices)
+        
+        if capa.selectedFeatureCount() > 0:
+            entidades = capa.getSelectedFeatures(peticion)
+            num_entidades = capa.selectedFeatureCount()
+            mensaje_seleccion = f"{num_entidades} entidades seleccionadas"
+        else:
+            entidades = capa.getFeatures(peticion)
+            num_entidades = capa.featureCount()
+            mensaje_seleccion = f"{num_entidades} entidades"
+        
+        filas = _leer_filas(entidades, indices)
+        
+        # Escribir archivo
+        if formato == "csv":
+            _escribir_csv(archivo_salida, nombres_campos, filas)
+        else:
+            esquema = pa.schema([
+                pa.field(nombre, _tipo_arrow(pa, campos.at(indice)))
+                for nombre, indice in zip(nombres_campos, indices)
+            ])
+            _escribir_arrow(archivo_salida, formato, esquema, filas,
+                            params.get('tamano_lote', 65536))
+        
+        return {
+            "status": "ok",
+            "mensaje": f"Exportado exitosamente:\n{archivo_salida}\n({mensaje_seleccion})",
+            "file": archivo_salida,
+            "features": num_entidades if num_entidades >= 0 else None
+        }
+    
+    except PermissionError:
+        return {
+            "status": "error",
+            "mensaje": "El archivo está abierto en otro programa. Ciérrelo e intente de nuevo."
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "mensaje": f"Error al exportar: {str(e)}"
+        }
@@ -1,17 +1,199 @@
 """Exporta los atributos de la capa activa a un archivo Excel"""
 
-from qgis.core import QgsProject, QgsVectorLayer
-from qgis.PyQt.QtWidgets import QFileDialog
+from qgis.core import QgsFeatureRequest, QgsVectorLayerFeatureSource
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
 import os
 from datetime import datetime
 
+# Excel admite 1.048.576 filas por hoja, una de ellas para el encabezado
+_MAX_FILAS_HOJA = 1048575
+
+
+def _valor_celda(valor):
+    """Convierte un valor de atributo a un tipo que Excel pueda guardar"""
+    # Manejar tipos de datos especiales
+    if valor is None:
+        return ""
+    if hasattr(valor, 'toString'):  # QDate, QDateTime
+        return valor.toString('yyyy-MM-dd')
+    if hasattr(valor, '__geo_interface__'):  # Geometría
+        return "GEOMETRY"
+    return valor
+
+
+def _escribir_muestra(ws, encabezados, anchos, muestra):
+    """Fija los anchos de columna y escribe el encabezado y las filas retenidas"""
+    from openpyxl.utils import get_column_letter
+    
+    for col, ancho in enumerate(anchos, 1):
+        ws.column_dimensions[get_column_letter(col)].width = min(ancho + 2, 50)
+    
+    ws.append(encabezados)
+    for fila in muestra:
+        ws.append(fila)
+    muestra.clear()
+
+
+def _escribir_hoja(ws, entidades, nombres_campos, indices, muestra_anchos):
+    """
+    Escribe el encabezado y las filas de las entidades en una hoja de solo
+    escritura y devuelve el número de filas escritas
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+    
+    # Encabezados con formato
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", 
+                             end_color="366092", 
+                             fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    
+    encabezados = []
+    for nombre_campo in nombres_campos:
+        celda = WriteOnlyCell(ws, value=nombre_campo)
+        celda.font = header_font
+        celda.fill = header_fill
+        celda.alignment = header_alignment
+        encabezados.append(celda)
+    
+    # Anchos de columna calculados en la misma pasada. En modo solo
+    # escritura deben fijarse antes de la primera fila, así que se
+    # estiman con las primeras 'muestra_anchos' filas
+    anchos = [len(nombre) for nombre in nombres_campos]
+    muestra = []
+    filas_escritas = 0
+    
+    for entidad in entidades:
+        atributos = entidad.attributes()
+        fila = [_valor_celda(atributos[indice]) for indice in indices]
+        
+        if muestra is None:
+            ws.append(fila)
+        else:
+            for col, valor in enumerate(fila):
+                anchos[col] = max(anchos[col], len(str(valor)))
+            muestra.append(fila)
+            if len(muestra) >= muestra_anchos:
+                _escribir_muestra(ws, encabezados, anchos, muestra)
+                muestra = None
+        
+        filas_escritas += 1
+    
+    if muestra is not None:
+        _escribir_muestra(ws, encabezados, anchos, muestra)
+    
+    # Agregar filtros automáticos
+    ws.auto_filter.ref = f"A1:{get_column_letter(max(len(nombres_campos), 1))}{filas_escritas + 1}"
+    return filas_escritas
+
+
+def _rangos_fids(fids, max_filas):
+    """
+    Divide una lista ordenada de fids en rangos (desde, hasta) de como
+    máximo 'max_filas' entidades; el último rango no tiene límite superior
+    """
+    limites = fids[::max_filas]
+    return list(zip(limites, limites[1:] + [None]))
+
+
+def _peticion_fragmento(peticion, fragmento):
+    """
+    Petición de un fragmento: un rango (desde, hasta) de fids, que el
+    proveedor resuelve como un filtro por rango en lugar de una lista de
+    fids, o una lista explícita de fids (selecciones)
+    """
+    peticion_fragmento = QgsFeatureRequest(peticion)
+    if isinstance(fragmento, tuple):
+        desde, hasta = fragmento
+        expresion = f"$id >= {desde}"
+        if hasta is not None:
+            expresion += f" AND $id < {hasta}"
+        peticion_fragmento.setFilterExpression(expresion)
+    else:
+        peticion_fragmento.setFilterFids(fragmento)
+    return peticion_fragmento
+
+
+def _titulo_hoja(titulo, numero=None):
+    """Título de hoja con sufijo opcional, dentro del límite de 31 caracteres de Excel"""
+    sufijo = f"_{numero}" if numero is not None else ""
+    return titulo[:31 - len(sufijo)] + sufijo
+
+
+def _escribir_libro(ruta, titulo, fragmento, fuente, peticion, nombres_campos,
+                    indices, muestra_anchos):
+    """
+    Escribe un libro de una hoja con las entidades de un fragmento, ver
+    _peticion_fragmento
+    
+    Las entidades se leen de un QgsVectorLayerFeatureSource creado en el
+    hilo principal para uso exclusivo de este libro.
+    """
+    from openpyxl import Workbook
+    
+    # Crear libro de Excel en modo solo escritura: las filas se
+    # envían al archivo a medida que se agregan
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=_titulo_hoja(titulo))
+    _escribir_hoja(ws, fuente.getFeatures(_peticion_fragmento(peticion, fragmento)),
+                   nombres_campos, indices, muestra_anchos)
+    wb.save(ruta)
+    return ruta
+
+
+def _escribir_libro_hojas(ruta, titulo, entidades, nombres_campos, indices,
+                          muestra_anchos, max_filas, numerar):
+    """
+    Escribe las entidades en un libro en una sola lectura, empezando una
+    hoja nueva cada 'max_filas' filas
+    
+    No depende del número de entidades que informe el proveedor, que
+    puede ser solo una estimación. Con 'numerar' la primera hoja lleva
+    sufijo aunque resulte ser la única.
+    
+    Returns:
+        tuple: Número de filas y de hojas escritas
+    """
+    from openpyxl import Workbook
+    
+    wb = Workbook(write_only=True)
+    entidades = iter(entidades)
+    siguiente = next(entidades, None)
+    filas = hojas = 0
+    
+    while hojas == 0 or siguiente is not None:
+        hojas += 1
+        ws = wb.create_sheet(title=_titulo_hoja(titulo, hojas if numerar or hojas > 1 else None))
+        if siguiente is not None:
+            lote = islice(chain([siguiente], entidades), max_filas)
+        else:
+            lote = entidades
+        filas += _escribir_hoja(ws, lote, nombres_campos, indices, muestra_anchos)
+        siguiente = next(entidades, None)
+    
+    wb.save(ruta)
+    return filas, hojas
+
+
 def ejecutar(iface, params=None):
     """
     Exporta la tabla de atributos de la capa activa a Excel
     
     Args:
         iface: Interfaz de QGIS
-        params: Parámetros opcionales (ruta de salida)
+        params: Parámetros opcionales ('output_path', 'campos' con la lista
+                de campos a exportar, 'muestra_anchos', 'dividir_en'
+                'hojas' o 'libros' si se supera el límite de filas,
+                'max_filas_hoja', 'hilos', 'abrir_carpeta' para abrir la
+                carpeta de salida al terminar). Con 'hojas' la capa se lee una
+                sola vez y se empieza una hoja nueva al llegar al límite;
+                con 'libros' los libros se
+                escriben en hilos: la lectura del proveedor se solapa, pero
+                openpyxl es Python puro y el GIL serializa la escritura,
+                así que no escala con el número de núcleos
     
     Returns:
         dict: Estado y mensaje del resultado
@@ -19,9 +201,6 @@ def ejecutar(iface, params=None):
     # Verificar que openpyxl está disponible
     try:
         import openpyxl
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
     except ImportError:
         return {
             "status": "error",
@@ -43,8 +222,11 @@ def ejecutar(iface, params=None):
         }
     
     try:
+        if params is None:
+            params = {}
+        
         # Determinar archivo de salida
-        if params and 'output_path' in params:
+        if 'output_path' in params:
             archivo_salida = params['output_path']
         else:
             # Usar diálogo para seleccionar ubicación
@@ -55,86 +237,97 @@ def ejecutar(iface, params=None):
                 nombre_sugerido
             )
         
-        # Crear libro de Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = capa.name()[:31]  # Excel limita a 31 caracteres
-        
-        # Obtener campos
+        # Obtener campos (todos o los indicados en 'campos')
         campos = capa.fields()
-        nombres_campos = [campo.name() for campo in campos]
-        
-        # Escribir encabezados con formato
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", 
-                                 end_color="366092", 
-                                 fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
+        if params.get('campos'):
+            nombres_campos = list(params['campos'])
+            inexistentes = [nombre for nombre in nombres_campos
+                            if campos.indexOf(nombre) < 0]
+            if inexistentes:
+                return {
+                    "status": "error",
+                    "mensaje": f"Campos inexistentes en la capa: {', '.join(inexistentes)}"
+                }
+        else:
+            nombres_campos = [campo.name() for campo in campos]
+        indices = [campos.indexOf(nombre) for nombre in nombres_campos]
         
-        for col, nombre_campo in enumerate(nombres_campos, 1):
-            celda = ws.cell(row=1, column=col, value=nombre_campo)
-            celda.font = header_font
-            celda.fill = header_fill
-            celda.alignment = header_alignment
+        # Obtener entidades (seleccionadas o todas) sin geometría y solo
+        # con los atributos exportados
+        peticion = QgsFeatureRequest()
+        peticion.setFlags(QgsFeatureRequest.NoGeometry)
+        peticion.setSubsetOfAttributes(indices)
         
-        # Obtener entidades (seleccionadas o todas)
-        if capa.selectedFeatureCount() > 0:
-            entidades = capa.selectedFeatures()
-            mensaje_seleccion = f"{capa.selectedFeatureCount()} entidades seleccionadas"
-        else:
-            entidades = capa.getFeatures()
-            mensaje_seleccion = f"{capa.featureCount()} entidades"
+        # Número de entidades (seleccionadas o todas); algunos proveedores
+        # solo lo estiman o devuelven -1 si no lo conocen
+        hay_seleccion = capa.selectedFeatureCount() > 0
+        total = capa.selectedFeatureCount() if hay_seleccion else capa.featureCount()
         
-        # Escribir datos
-        fila = 2
-        for entidad in entidades:
-            for col, campo in enumerate(nombres_campos, 1):
-                valor = entidad[campo]
-                
-                # Manejar tipos de datos especiales
-                if valor is None:
-                    valor = ""
-                elif hasattr(valor, 'toString'):  # QDate, QDateTime
-                    valor = valor.toString('yyyy-MM-dd')
-                elif hasattr(valor, '__geo_interface__'):  # Geometría
-                    valor = "GEOMETRY"
-                
-                ws.cell(row=fila, column=col, value=valor)
-            
-            fila += 1
+        muestra_anchos = params.get('muestra_anchos', 1000)
+        max_filas = min(params.get('max_filas_hoja', _MAX_FILAS_HOJA),
+                        _MAX_FILAS_HOJA)
+        division = params.get('dividir_en', 'hojas')
+        titulo = capa.name()
         
-        # Ajustar ancho de columnas
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
+        if division == 'libros' and (total < 0 or total > max_filas):
+            # Un libro por fragmento en hilos: rangos de fid para la capa
+            # completa, listas de fids para una selección
+            fids = sorted(capa.selectedFeatureIds() if hay_seleccion
+                          else capa.allFeatureIds())
+            total = len(fids)
+            if hay_seleccion:
+                fragmentos = [fids[i:i + max_filas] for i in range(0, len(fids), max_filas)]
+            else:
+                fragmentos = _rangos_fids(fids, max_filas)
             
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        # Agregar filtros automáticos
-        ws.auto_filter.ref = ws.dimensions
+            # Cada libro tiene su propia fuente de entidades, creada aquí,
+            # en el hilo principal
+            base, extension = os.path.splitext(archivo_salida)
+            hilos = params.get('hilos', os.cpu_count() or 1)
+            fuentes = [QgsVectorLayerFeatureSource(capa) for _ in fragmentos]
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                futuros = [
+                    pool.submit(_escribir_libro, f"{base}_{n}{extension}", titulo,
+                                fragmento, fuente, peticion, nombres_campos,
+                                indices, muestra_anchos)
+                    for n, (fragmento, fuente) in enumerate(zip(fragmentos, fuentes), 1)
+                ]
+                archivos = [futuro.result() for futuro in futuros]
+            divisiones = (len(fragmentos), "libros")
+        else:
+            # Un solo libro leído de una vez, con una hoja nueva cada
+            # 'max_filas' filas aunque el número de entidades sea una
+            # estimación
+            if hay_seleccion:
+                peticion.setFilterFids(capa.selectedFeatureIds())
+            total, hojas = _escribir_libro_hojas(archivo_salida, titulo,
+                                                 capa.getFeatures(peticion),
+                                                 nombres_campos, indices,
+                                                 muestra_anchos, max_filas,
+                                                 numerar=total > max_filas)
+            archivos = [archivo_salida]
+            divisiones = (hojas, "hojas")
         
-        # Guardar archivo
-        wb.save(archivo_salida)
+        if hay_seleccion:
+            mensaje_seleccion = f"{total} entidades seleccionadas"
+        else:
+            mensaje_seleccion = f"{total} entidades"
+        if divisiones[0] > 1:
+            mensaje_seleccion += f", divididas en {divisiones[0]} {divisiones[1]}"
         
         # Abrir carpeta contenedora
-        carpeta = os.path.dirname(archivo_salida)
-        if os.name == 'nt':  # Windows
-            os.startfile(carpeta)
-        elif os.name == 'posix':  # macOS and Linux
-            os.system(f'open "{carpeta}"' if os.uname().sysname == 'Darwin' 
-                     else f'xdg-open "{carpeta}"')
+        if params.get('abrir_carpeta', True):
+            carpeta = os.path.dirname(archivo_salida)
+            if os.name == 'nt':  # Windows
+                os.startfile(carpeta)
+            elif os.name == 'posix':  # macOS and Linux
+                os.system(f'open "{carpeta}"' if os.uname().sysname == 'Darwin' 
+                         else f'xdg-open "{carpeta}"')
         
         return {
             "status": "ok",
-            "mensaje": f"Exportado exitosamente:\n{archivo_salida}\n({mensaje_seleccion})"
+            "mensaje": "Exportado exitosamente:\n" + "\n".join(archivos) + f"\n({mensaje_seleccion})",
+            "features": total
         }
         
     except PermissionError:
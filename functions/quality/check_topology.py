@@ -0,0 +1,222 @@
+"""Detecta superposiciones, astillas, huecos y duplicados en la capa activa"""
+
+from qgis.core import (QgsProject, QgsVectorLayer, QgsFeature, QgsGeometry,
+                       QgsField, QgsFields, QgsWkbTypes, QgsFeatureRequest,
+                       QgsSpatialIndex, QgsFeedback)
+from qgis.PyQt.QtCore import QVariant, QCoreApplication
+import math
+
+# Tipos de error registrados en la capa de salida
+_SUPERPOSICION = "superposicion"
+_ASTILLA = "astilla"
+_HUECO = "hueco"
+_DUPLICADO = "duplicado"
+
+
+def _partes_poligonales(geom):
+    """Devuelve solo las partes poligonales de una geometría como multipolígono"""
+    if geom.type() == QgsWkbTypes.PolygonGeometry:
+        resultado = QgsGeometry(geom)
+    else:
+        partes = [parte for parte in geom.asGeometryCollection()
+                  if parte.type() == QgsWkbTypes.PolygonGeometry]
+        if not partes:
+            return None
+        resultado = QgsGeometry.collectGeometry(partes)
+    resultado.convertToMultiType()
+    return resultado
+
+
+def _es_astilla(geom, area_astilla, compacidad_astilla):
+    """
+    Una superposición es astilla si su área es pequeña o si es muy alargada
+    (compacidad 4πA/P² cercana a 0)
+    """
+    area = geom.area()
+    if area <= area_astilla:
+        return True
+    perimetro = geom.length()
+    return perimetro > 0 and 4 * math.pi * area / (perimetro ** 2) < compacidad_astilla
+
+
+def _nueva_entidad(campos, geom, tipo, id_a, id_b):
+    """Crea una entidad de error"""
+    entidad = QgsFeature(campos)
+    entidad.setGeometry(geom)
+    entidad.setAttributes([tipo, id_a, id_b, geom.area()])
+    return entidad
+
+
+def ejecutar(iface, params=None):
+    """
+    Revisa la topología de la capa poligonal activa y guarda los errores
+    en una capa nueva
+    
+    Args:
+        iface: Interfaz de QGIS
+        params: Parámetros opcionales ('detectar_huecos', 'area_astilla',
+                'compacidad_astilla', 'area_max_hueco', 'tamano_lote',
+                'feedback' QgsFeedback para progreso y cancelación)
+    
+    Returns:
+        dict: Estado y mensaje del resultado
+    """
+    capa = iface.activeLayer()
+    
+    if not capa or capa.type() != 0:
+        return {
+            "status": "warning",
+            "mensaje": "Seleccione una capa vectorial para revisar"
+        }
+    
+    if capa.geometryType() != QgsWkbTypes.PolygonGeometry:
+        return {
+            "status": "error",
+            "mensaje": "La revisión de topología requiere una capa de polígonos"
+        }
+    
+    if params is None:
+        params = {}
+    
+    try:
+        detectar_huecos = params.get('detectar_huecos', True)
+        area_astilla = params.get('area_astilla', 1.0)
+        compacidad_astilla = params.get('compacidad_astilla', 0.05)
+        area_max_hueco = params.get('area_max_hueco')
+        tamano_lote = params.get('tamano_lote', 5000)
+        feedback = params.get('feedback') or QgsFeedback()
+        
+        total = capa.featureCount()
+        peticion = QgsFeatureRequest().setNoAttributes()
+        
+        # Índice espacial con carga masiva que guarda las geometrías
+        indice = QgsSpatialIndex(capa.getFeatures(peticion),
+                                 flags=QgsSpatialIndex.FlagStoreFeatureGeometries)
+        
+        # Capa de errores
+        campos = QgsFields()
+        campos.append(QgsField("tipo", QVariant.String))
+        campos.append(QgsField("id_a", QVariant.LongLong))
+        campos.append(QgsField("id_b", QVariant.LongLong))
+        campos.append(QgsField("area", QVariant.Double))
+        
+        capa_errores = QgsVectorLayer(
+            f"MultiPolygon?crs={capa.crs().authid()}",
+            f"Errores_topologia_{capa.name()}",
+            "memory"
+        )
+        proveedor = capa_errores.dataProvider()
+        proveedor.addAttributes(campos)
+        capa_errores.updateFields()
+        
+        conteo = {_SUPERPOSICION: 0, _ASTILLA: 0, _HUECO: 0, _DUPLICADO: 0}
+        errores = []
+        fids_union = []
+        procesadas = 0
+        
+        # Comparar cada entidad solo con los candidatos del índice
+        for entidad in capa.getFeatures(peticion):
+            if feedback.isCanceled():
+                break
+            
+            geom = entidad.geometry()
+            fid = entidad.id()
+            procesadas += 1
+            if geom.isEmpty():
+                continue
+            if detectar_huecos:
+                fids_union.append(fid)
+            
+            candidatos = [candidato for candidato in indice.intersects(geom.boundingBox())
+                          if candidato > fid]
+            if candidatos:
+                # Geometría preparada para acelerar las pruebas de intersección
+                motor = QgsGeometry.createGeometryEngine(geom.constGet())
+                motor.prepareGeometry()
+                
+                for candidato in candidatos:
+                    geom_b = indice.geometry(candidato)
+                    if not motor.intersects(geom_b.constGet()):
+                        continue
+                    
+                    if geom.isGeosEqual(geom_b):
+                        tipo = _DUPLICADO
+                        geom_error = _partes_poligonales(geom)
+                    else:
+                        interseccion = geom.intersection(geom_b)
+                        geom_error = _partes_poligonales(interseccion)
+                        if geom_error is None or geom_error.area() <= 0:
+                            continue  # Solo se tocan en bordes o vértices
+                        if _es_astilla(geom_error, area_astilla, compacidad_astilla):
+                            tipo = _ASTILLA
+                        else:
+                            tipo = _SUPERPOSICION
+                    
+                    conteo[tipo] += 1
+                    errores.append(_nueva_entidad(campos, geom_error, tipo, fid, candidato))
+            
+            # Volcar los errores a la capa por lotes
+            if len(errores) >= tamano_lote:
+                proveedor.addFeatures(errores)
+                errores = []
+            
+            if procesadas % tamano_lote == 0:
+                if total > 0:
+                    feedback.setProgress(100.0 * procesadas / total)
+                QCoreApplication.processEvents()
+        
+        # Huecos: anillos interiores de la unión de todos los polígonos. Las
+        # geometrías se toman del índice, que ya las guarda, en lugar de
+        # conservar una segunda copia durante el recorrido
+        if detectar_huecos and fids_union and not feedback.isCanceled():
+            union = QgsGeometry.unaryUnion([indice.geometry(fid) for fid in fids_union])
+            fids_union = []
+            for parte in union.asGeometryCollection():
+                if parte.type() != QgsWkbTypes.PolygonGeometry:
+                    continue
+                for anillo in parte.asPolygon()[1:]:
+                    hueco = QgsGeometry.fromPolygonXY([anillo])
+                    if area_max_hueco is not None and hueco.area() > area_max_hueco:
+                        continue
+                    hueco.convertToMultiType()
+                    conteo[_HUECO] += 1
+                    errores.append(_nueva_entidad(campos, hueco, _HUECO, None, None))
+        
+        if errores:
+            proveedor.addFeatures(errores)
+        capa_errores.updateExtents()
+        
+        total_errores = sum(conteo.values())
+        if feedback.isCanceled():
+            estado = "warning"
+            resumen = f"Revisión cancelada tras {procesadas} de {total} entidades\n"
+        elif total_errores == 0:
+            return {
+                "status": "ok",
+                "mensaje": f"✓ No se encontraron errores de topología en {total} entidades",
+                "features": procesadas
+            }
+        else:
+            estado = "warning"
+            resumen = f"Errores de topología en {total} entidades:\n"
+        
+        resumen += "\n".join([
+            f"• {conteo[_SUPERPOSICION]} superposiciones",
+            f"• {conteo[_ASTILLA]} astillas",
+            f"• {conteo[_HUECO]} huecos",
+            f"• {conteo[_DUPLICADO]} duplicados",
+        ])
+        
+        QgsProject.instance().addMapLayer(capa_errores)
+        
+        return {
+            "status": estado,
+            "mensaje": resumen,
+            "features": procesadas
+        }
+    
+    except Exception as e:
+        return {
+            "status": "error",
+            "mensaje": f"Error al revisar la topología: {str(e)}"
+        }
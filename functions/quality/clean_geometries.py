@@ -1,8 +1,383 @@
 """Detecta y corrige geometrías inválidas en la capa activa"""
 
-from qgis.core import (QgsProject, QgsVectorLayer, QgsFeature, 
-                       QgsGeometry, QgsWkbTypes, QgsMessageLog, Qgis)
-import processing
+from qgis.core import (QgsProject, QgsVectorLayer, QgsGeometry,
+                       QgsWkbTypes, QgsMessageLog, Qgis, QgsVectorFileWriter,
+                       QgsVectorDataProvider, QgsFeatureRequest, QgsFeedback,
+                       QgsApplication)
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtWidgets import QProgressDialog
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import time
+
+# Formatos de archivo admitidos para la salida en disco
+_DRIVERS_SALIDA = {".gpkg": "GPKG", ".fgb": "FlatGeobuf"}
+
+# Veredictos de la validación de una geometría
+_VACIA = "vacia"
+_REPARADA = "reparada"
+_NO_REPARADA = "no_reparada"
+
+
+def _hash_wkb(wkb):
+    """Hash corto del WKB de una geometría"""
+    return hashlib.blake2b(wkb, digest_size=16).digest()
+
+
+class _CacheValidacion:
+    """
+    Índice persistente (SQLite) de las geometrías ya validadas de una capa
+    
+    Guarda por (fuente, fid) el hash del WKB y si la geometría era válida.
+    Si cambia la huella del entorno (versión de QGIS/GEOS o tipo de
+    geometría de la capa) se descartan las entradas de esa fuente. El total
+    de entradas se limita a 'max_entradas' eliminando primero las capas
+    usadas hace más tiempo.
+    """
+    
+    def __init__(self, ruta, capa, max_entradas):
+        import sqlite3
+        
+        carpeta = os.path.dirname(ruta)
+        if carpeta and not os.path.exists(carpeta):
+            os.makedirs(carpeta)
+        
+        self.max_entradas = max_entradas
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS capas (
+                fuente TEXT PRIMARY KEY,
+                huella TEXT NOT NULL,
+                ultimo_uso REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS geometrias (
+                fuente TEXT NOT NULL,
+                fid INTEGER NOT NULL,
+                hash BLOB NOT NULL,
+                valida INTEGER NOT NULL,
+                PRIMARY KEY (fuente, fid)
+            ) WITHOUT ROWID;
+        """)
+        
+        # La URI puede contener credenciales: solo se guarda su hash
+        self.fuente = hashlib.sha1(
+            f"{capa.providerType()}|{capa.source()}".encode("utf-8")
+        ).hexdigest()
+        geos = Qgis.geosVersion() if hasattr(Qgis, 'geosVersion') else ""
+        huella = f"{Qgis.QGIS_VERSION}|{geos}|{capa.wkbType()}"
+        
+        fila = self.conexion.execute(
+            "SELECT huella FROM capas WHERE fuente = ?", (self.fuente,)
+        ).fetchone()
+        if fila is None or fila[0] != huella:
+            self.conexion.execute("DELETE FROM geometrias WHERE fuente = ?", (self.fuente,))
+        self.conexion.execute(
+            "INSERT OR REPLACE INTO capas VALUES (?, ?, ?)",
+            (self.fuente, huella, time.time())
+        )
+        self.conexion.commit()
+    
+    def consultar(self, fids):
+        """Devuelve {fid: (hash, válida)} de los fids presentes en la caché"""
+        conocidos = {}
+        fids = list(fids)
+        # SQLite limita el número de parámetros por consulta
+        for inicio in range(0, len(fids), 900):
+            parte = fids[inicio:inicio + 900]
+            marcadores = ",".join("?" * len(parte))
+            filas = self.conexion.execute(
+                f"SELECT fid, hash, valida FROM geometrias "
+                f"WHERE fuente = ? AND fid IN ({marcadores})",
+                [self.fuente] + parte
+            )
+            for fid, hash_wkb, valida in filas:
+                conocidos[fid] = (hash_wkb, bool(valida))
+        return conocidos
+    
+    def guardar(self, registros):
+        """Guarda una lista de (fid, hash, válida)"""
+        if not registros:
+            return
+        self.conexion.executemany(
+            "INSERT OR REPLACE INTO geometrias VALUES (?, ?, ?, ?)",
+            [(self.fuente, fid, hash_wkb, int(valida))
+             for fid, hash_wkb, valida in registros]
+        )
+        self.conexion.commit()
+    
+    def cerrar(self):
+        """Aplica el límite de tamaño y cierra la conexión"""
+        try:
+            self._limitar()
+        finally:
+            self.conexion.close()
+    
+    def _limitar(self):
+        exceso = self.conexion.execute(
+            "SELECT COUNT(*) FROM geometrias"
+        ).fetchone()[0] - self.max_entradas
+        
+        # Eliminar primero las capas usadas hace más tiempo
+        antiguas = self.conexion.execute(
+            "SELECT fuente FROM capas WHERE fuente != ? ORDER BY ultimo_uso",
+            (self.fuente,)
+        ).fetchall()
+        for (fuente,) in antiguas:
+            if exceso <= 0:
+                break
+            exceso -= self.conexion.execute(
+                "DELETE FROM geometrias WHERE fuente = ?", (fuente,)
+            ).rowcount
+            self.conexion.execute("DELETE FROM capas WHERE fuente = ?", (fuente,))
+        
+        # Si la capa actual sola supera el límite, recortar sus entradas
+        if exceso > 0:
+            self.conexion.execute(
+                "DELETE FROM geometrias WHERE fuente = ? AND fid IN "
+                "(SELECT fid FROM geometrias WHERE fuente = ? LIMIT ?)",
+                (self.fuente, self.fuente, exceso)
+            )
+        self.conexion.commit()
+
+
+def _crear_escritor(ruta, campos, tipo_geometria, crs):
+    """Crea un QgsVectorFileWriter para una salida GeoPackage o FlatGeobuf"""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in _DRIVERS_SALIDA:
+        raise ValueError(f"Formato de salida no soportado: '{extension}' (use .gpkg o .fgb)")
+    
+    opciones = QgsVectorFileWriter.SaveVectorOptions()
+    opciones.driverName = _DRIVERS_SALIDA[extension]
+    opciones.fileEncoding = "UTF-8"
+    opciones.layerName = os.path.splitext(os.path.basename(ruta))[0]
+    
+    escritor = QgsVectorFileWriter.create(
+        ruta, campos, tipo_geometria, crs,
+        QgsProject.instance().transformContext(), opciones
+    )
+    if escritor.hasError() != QgsVectorFileWriter.NoError:
+        raise IOError(escritor.errorMessage())
+    return escritor
+
+
+def _reparar_geometria(geom):
+    """Repara una geometría con makeValid y, si falla, con buffer(0)"""
+    geom_reparada = geom.makeValid()
+    if geom_reparada and geom_reparada.isValid():
+        return geom_reparada
+    
+    geom_buffer = geom.buffer(0, 5)
+    if geom_buffer and geom_buffer.isValid():
+        return geom_buffer
+    return None
+
+
+def _validar_bloque(bloque, conocidos):
+    """
+    Valida y repara un bloque de geometrías (fid, WKB) en un hilo del pool
+    
+    Las geometrías cuyo hash coincide con una entrada válida de 'conocidos'
+    se omiten. Devuelve {fid: (veredicto, WKB reparado o None)} solo para
+    las geometrías vacías o inválidas, y los registros (fid, hash, válida)
+    a guardar en la caché.
+    """
+    veredictos = {}
+    registros = []
+    for fid, wkb in bloque:
+        hash_wkb = _hash_wkb(wkb)
+        if conocidos.get(fid) == (hash_wkb, True):
+            continue
+        
+        geom = QgsGeometry()
+        geom.fromWkb(wkb)
+        
+        if geom.isEmpty():
+            veredictos[fid] = (_VACIA, None)
+        elif geom.isValid():
+            registros.append((fid, hash_wkb, True))
+        else:
+            registros.append((fid, hash_wkb, False))
+            geom_reparada = _reparar_geometria(geom)
+            if geom_reparada:
+                veredictos[fid] = (_REPARADA, bytes(geom_reparada.asWkb()))
+            else:
+                veredictos[fid] = (_NO_REPARADA, None)
+    return veredictos, registros
+
+
+def _validar_por_lotes(entidades, pool, hilos, tamano_lote, feedback, total,
+                       cache=None):
+    """
+    Recorre las entidades en lotes y valida cada lote repartido entre los
+    hilos del pool
+    
+    Genera (lote de entidades, veredictos) e informa el progreso en
+    'feedback'; se detiene entre lotes si se cancela.
+    """
+    procesadas = 0
+    lote = []
+    for entidad in entidades:
+        lote.append(entidad)
+        if len(lote) < tamano_lote:
+            continue
+        
+        yield lote, _validar_lote(lote, pool, hilos, cache)
+        procesadas += len(lote)
+        lote = []
+        
+        if total > 0:
+            feedback.setProgress(100.0 * procesadas / total)
+        QCoreApplication.processEvents()
+        if feedback.isCanceled():
+            return
+    
+    if lote:
+        yield lote, _validar_lote(lote, pool, hilos, cache)
+        feedback.setProgress(100.0)
+
+
+def _validar_lote(lote, pool, hilos, cache=None):
+    """Reparte un lote de entidades en bloques WKB y une los veredictos"""
+    geometrias = [(entidad.id(), bytes(entidad.geometry().asWkb())) for entidad in lote]
+    conocidos = cache.consultar(fid for fid, _ in geometrias) if cache else {}
+    
+    tamano_bloque = max(1, -(-len(geometrias) // hilos))
+    bloques = [geometrias[j:j + tamano_bloque]
+               for j in range(0, len(geometrias), tamano_bloque)]
+    
+    veredictos = {}
+    registros = []
+    for parcial, registros_bloque in pool.map(_validar_bloque, bloques,
+                                              [conocidos] * len(bloques)):
+        veredictos.update(parcial)
+        registros.extend(registros_bloque)
+    
+    if cache:
+        cache.guardar(registros)
+    return veredictos
+
+
+def _abrir_cache(capa, params):
+    """Abre la caché de validación salvo que 'usar_cache' sea False"""
+    if not params.get('usar_cache', True):
+        return None
+    
+    ruta = params.get('ruta_cache') or os.path.join(
+        QgsApplication.qgisSettingsDirPath(), "cache", "clean_geometries.sqlite"
+    )
+    return _CacheValidacion(ruta, capa, params.get('cache_max_entradas', 5000000))
+
+
+def _crear_feedback(iface, params):
+    """
+    Devuelve el QgsFeedback de 'params' o uno nuevo conectado a un diálogo
+    de progreso con botón de cancelar
+    """
+    if params.get('feedback') is not None:
+        return params['feedback'], None
+    
+    feedback = QgsFeedback()
+    dialogo = QProgressDialog("Validando geometrías...", "Cancelar", 0, 100,
+                              iface.mainWindow())
+    dialogo.setWindowTitle("Limpiar geometrías")
+    dialogo.setMinimumDuration(0)
+    dialogo.canceled.connect(feedback.cancel)
+    feedback.progressChanged.connect(lambda valor: dialogo.setValue(int(valor)))
+    dialogo.show()
+    return feedback, dialogo
+
+
+def _aplicar_reparaciones(proveedor, lote_reparadas):
+    """
+    Escribe un lote {fid: geometría} con una sola llamada al proveedor,
+    vacía el lote y devuelve el número de geometrías aplicadas
+    """
+    total = len(lote_reparadas)
+    aplicado = proveedor.changeGeometryValues(lote_reparadas)
+    lote_reparadas.clear()
+    if not aplicado:
+        QgsMessageLog.logMessage(
+            f"No se pudo aplicar un lote de {total} geometrías reparadas",
+            "clean_geometries", Qgis.Warning
+        )
+        return 0
+    return total
+
+
+def _exportar_limpia(capa, ruta_salida, params, pool, hilos, feedback, cache):
+    """
+    Escribe una copia reparada de la capa en disco sin modificar el origen
+    
+    Las entidades se leen, validan y escriben en lotes de 'tamano_lote'.
+    """
+    tamano_lote = params.get('tamano_lote', 5000)
+    eliminar_vacias = params.get('eliminar_vacias', False)
+    
+    tipo_geometria = QgsWkbTypes.multiType(capa.wkbType())
+    escritor = _crear_escritor(ruta_salida, capa.fields(), tipo_geometria, capa.crs())
+    
+    invalidas = 0
+    vacias = 0
+    reparadas = 0
+    procesadas = 0
+    
+    for lote, veredictos in _validar_por_lotes(capa.getFeatures(), pool, hilos,
+                                               tamano_lote, feedback,
+                                               capa.featureCount(), cache):
+        procesadas += len(lote)
+        salida = []
+        for entidad in lote:
+            veredicto, wkb = veredictos.get(entidad.id(), (None, None))
+            
+            if veredicto == _VACIA:
+                vacias += 1
+                if eliminar_vacias:
+                    continue
+            elif veredicto is not None:
+                invalidas += 1
+                if veredicto == _REPARADA:
+                    geom_reparada = QgsGeometry()
+                    geom_reparada.fromWkb(wkb)
+                    entidad.setGeometry(geom_reparada)
+                    reparadas += 1
+            
+            salida.append(entidad)
+        
+        if salida and not escritor.addFeatures(salida):
+            raise IOError(escritor.errorMessage())
+    
+    # Cerrar el archivo y cargarlo como capa
+    del escritor
+    
+    if feedback.isCanceled():
+        return {
+            "status": "warning",
+            "mensaje": f"Proceso cancelado. La copia en {ruta_salida} está incompleta.",
+            "features": procesadas
+        }
+    
+    capa_limpia = QgsVectorLayer(ruta_salida, f"{capa.name()}_limpia", "ogr")
+    if not capa_limpia.isValid():
+        raise IOError(f"No se pudo abrir la salida: {ruta_salida}")
+    QgsProject.instance().addMapLayer(capa_limpia)
+    
+    resumen = f"Copia reparada guardada en:\n{ruta_salida}"
+    if invalidas:
+        resumen += f"\n\n✓ Reparadas {reparadas} de {invalidas} geometrías inválidas"
+        if reparadas < invalidas:
+            resumen += f"\n✗ No se pudieron reparar {invalidas - reparadas} geometrías"
+    if vacias:
+        accion = "omitidas" if eliminar_vacias else "copiadas sin cambios"
+        resumen += f"\n• {vacias} geometrías vacías {accion}"
+    
+    return {
+        "status": "ok" if reparadas == invalidas else "warning",
+        "mensaje": resumen,
+        "file": ruta_salida,
+        "features": procesadas
+    }
+
 
 def ejecutar(iface, params=None):
     """
@@ -10,7 +385,11 @@ def ejecutar(iface, params=None):
     
     Args:
         iface: Interfaz de QGIS
-        params: Parámetros opcionales
+        params: Parámetros opcionales ('eliminar_vacias', 'output_path'
+                .gpkg/.fgb para escribir una copia reparada, 'tamano_lote',
+                'hilos', 'feedback' QgsFeedback para progreso y cancelación,
+                'usar_cache', 'ruta_cache' y 'cache_max_entradas' para la
+                caché de validación incremental)
     
     Returns:
         dict: Estado y mensaje del resultado
@@ -30,27 +409,80 @@ def ejecutar(iface, params=None):
             "mensaje": "La capa está en modo edición. Guarde o cancele los cambios primero."
         }
     
+    if params is None:
+        params = {}
+    
+    dialogo = None
+    cache = None
     try:
+        tamano_lote = params.get('tamano_lote', 5000)
+        hilos = params.get('hilos', os.cpu_count() or 1)
+        feedback, dialogo = _crear_feedback(iface, params)
+        cache = _abrir_cache(capa, params)
+        
+        # Escribir una copia reparada en disco en lugar de editar la capa
+        if params.get('output_path'):
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                return _exportar_limpia(capa, params['output_path'], params,
+                                        pool, hilos, feedback, cache)
+        
+        proveedor = capa.dataProvider()
+        if not proveedor.capabilities() & QgsVectorDataProvider.ChangeGeometries:
+            return {
+                "status": "error",
+                "mensaje": "El proveedor de la capa no permite modificar geometrías"
+            }
+        
         # Contadores
         total_entidades = capa.featureCount()
-        geometrias_invalidas = []
+        geometrias_invalidas = 0
         geometrias_vacias = []
+        no_reparadas = []
         geometrias_reparadas = 0
+        procesadas = 0
         
-        # Analizar geometrías
-        for entidad in capa.getFeatures():
-            geom = entidad.geometry()
-            
-            if geom.isEmpty():
-                geometrias_vacias.append(entidad.id())
-            elif not geom.isValid():
-                geometrias_invalidas.append(entidad.id())
+        # Validar y reparar en una sola pasada repartida entre los hilos; las
+        # reparaciones de cada lote se aplican en el proveedor con una llamada
+        peticion = QgsFeatureRequest().setNoAttributes()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            for lote, veredictos in _validar_por_lotes(capa.getFeatures(peticion),
+                                                       pool, hilos, tamano_lote,
+                                                       feedback, total_entidades,
+                                                       cache):
+                procesadas += len(lote)
+                lote_reparadas = {}
+                
+                for fid, (veredicto, wkb) in veredictos.items():
+                    if veredicto == _VACIA:
+                        geometrias_vacias.append(fid)
+                        continue
+                    
+                    geometrias_invalidas += 1
+                    if veredicto == _REPARADA:
+                        geom_reparada = QgsGeometry()
+                        geom_reparada.fromWkb(wkb)
+                        lote_reparadas[fid] = geom_reparada
+                    else:
+                        no_reparadas.append(fid)
+                
+                if lote_reparadas:
+                    registros = [(fid, _hash_wkb(bytes(geom.asWkb())), True)
+                                 for fid, geom in lote_reparadas.items()]
+                    aplicadas = _aplicar_reparaciones(proveedor, lote_reparadas)
+                    geometrias_reparadas += aplicadas
+                    
+                    # Las geometrías reparadas ya guardadas son válidas
+                    if cache and aplicadas:
+                        cache.guardar(registros)
+        
+        cancelado = feedback.isCanceled()
         
         # Si no hay problemas
-        if not geometrias_invalidas and not geometrias_vacias:
+        if not cancelado and not geometrias_invalidas and not geometrias_vacias:
             return {
                 "status": "ok",
-                "mensaje": f"✓ Todas las {total_entidades} geometrías son válidas"
+                "mensaje": f"✓ Todas las {total_entidades} geometrías son válidas",
+                "features": procesadas
             }
         
         # Preparar mensaje de problemas encontrados
@@ -58,73 +490,56 @@ def ejecutar(iface, params=None):
         if geometrias_vacias:
             problemas.append(f"{len(geometrias_vacias)} geometrías vacías")
         if geometrias_invalidas:
-            problemas.append(f"{len(geometrias_invalidas)} geometrías inválidas")
-        
-        # Intentar reparar
-        capa.startEditing()
-        
-        # Reparar geometrías inválidas
-        for fid in geometrias_invalidas:
-            entidad = capa.getFeature(fid)
-            geom = entidad.geometry()
-            
-            # Intentar reparación con makeValid
-            geom_reparada = geom.makeValid()
-            
-            if geom_reparada and geom_reparada.isValid():
-                capa.changeGeometry(fid, geom_reparada)
-                geometrias_reparadas += 1
-            else:
-                # Intentar buffer(0) como alternativa
-                geom_buffer = geom.buffer(0, 5)
-                if geom_buffer and geom_buffer.isValid():
-                    capa.changeGeometry(fid, geom_buffer)
-                    geometrias_reparadas += 1
+            problemas.append(f"{geometrias_invalidas} geometrías inválidas")
         
         # Eliminar geometrías vacías si el usuario lo desea
-        if geometrias_vacias and params and params.get('eliminar_vacias', False):
-            capa.deleteFeatures(geometrias_vacias)
-            mensaje_vacias = f"\n• Eliminadas {len(geometrias_vacias)} entidades con geometrías vacías"
-        else:
-            mensaje_vacias = ""
+        mensaje_vacias = ""
+        if geometrias_vacias and not cancelado and params.get('eliminar_vacias', False):
+            if proveedor.deleteFeatures(geometrias_vacias):
+                mensaje_vacias = f"\n• Eliminadas {len(geometrias_vacias)} entidades con geometrías vacías"
+            else:
+                mensaje_vacias = "\n✗ No se pudieron eliminar las entidades con geometrías vacías"
         
-        # Guardar cambios
-        if capa.commitChanges():
-            # Preparar resumen
-            resumen = f"Problemas encontrados:\n"
+        # Preparar resumen
+        resumen = ""
+        if cancelado:
+            resumen += (f"Proceso cancelado tras revisar {procesadas} de {total_entidades} "
+                        f"entidades. Las reparaciones ya aplicadas se mantienen.\n\n")
+        if problemas:
+            resumen += f"Problemas encontrados:\n"
             resumen += "\n".join(f"• {p}" for p in problemas)
-            
-            if geometrias_reparadas > 0:
-                resumen += f"\n\n✓ Reparadas {geometrias_reparadas} geometrías"
-            
-            if geometrias_invalidas and geometrias_reparadas < len(geometrias_invalidas):
-                no_reparadas = len(geometrias_invalidas) - geometrias_reparadas
-                resumen += f"\n✗ No se pudieron reparar {no_reparadas} geometrías"
-                resumen += f"\n\nIDs no reparados: {geometrias_invalidas[:10]}"
-                if len(geometrias_invalidas) > 10:
+        
+        if geometrias_reparadas > 0:
+            resumen += f"\n\n✓ Reparadas {geometrias_reparadas} geometrías"
+        
+        if geometrias_reparadas < geometrias_invalidas:
+            resumen += f"\n✗ No se pudieron reparar {geometrias_invalidas - geometrias_reparadas} geometrías"
+            if no_reparadas:
+                resumen += f"\n\nIDs no reparados: {no_reparadas[:10]}"
+                if len(no_reparadas) > 10:
                     resumen += "..."
-            
-            resumen += mensaje_vacias
-            
-            # Actualizar canvas
-            iface.mapCanvas().refresh()
-            
-            return {
-                "status": "ok" if geometrias_reparadas == len(geometrias_invalidas) else "warning",
-                "mensaje": resumen
-            }
-        else:
-            capa.rollBack()
-            return {
-                "status": "error",
-                "mensaje": "Error al guardar los cambios. Se revirtieron las modificaciones."
-            }
-            
-    except Exception as e:
-        if capa.isEditable():
-            capa.rollBack()
+        
+        resumen += mensaje_vacias
+        
+        # Actualizar capa y canvas
+        capa.updateExtents()
+        capa.triggerRepaint()
+        iface.mapCanvas().refresh()
         
+        return {
+            "status": "ok" if not cancelado and geometrias_reparadas == geometrias_invalidas else "warning",
+            "mensaje": resumen.strip(),
+            "features": procesadas
+        }
+        
+    except Exception as e:
         return {
             "status": "error",
             "mensaje": f"Error al procesar geometrías: {str(e)}"
         }
+    
+    finally:
+        if cache is not None:
+            cache.cerrar()
+        if dialogo is not None:
+            dialogo.close()
@@ -1,11 +1,127 @@
 """Zoom to the extent of the active layer"""
 
-def execute(iface):
+from qgis.core import (QgsDataSourceUri, QgsFeatureRequest, QgsRectangle,
+                       QgsVectorLayer)
+import os
+
+# Extents already resolved in this session: layer id -> (data stamp, extent)
+_EXTENT_CACHE = {}
+
+# Layers whose data changes already invalidate their cached extent
+_WATCHED_LAYERS = set()
+
+
+# Files next to the main source whose changes can also change the extent
+_SIDECARS = {".shp": (".dbf", ".shx", ".prj", ".cpg")}
+
+
+def _source_files(path):
+    """Main source file plus its sidecars (shapefile parts, SQLite WAL)"""
+    files = [path]
+    stem, extension = os.path.splitext(path)
+    for sidecar in _SIDECARS.get(extension.lower(), ()):
+        for candidate in (stem + sidecar, stem + sidecar.upper()):
+            if os.path.isfile(candidate):
+                files.append(candidate)
+                break
+    if os.path.isfile(path + "-wal"):
+        files.append(path + "-wal")
+    return files
+
+
+def _data_stamp(layer):
+    """
+    Modification stamp of a file-based layer and its sidecars, or None for
+    other sources. GeoPackage writes from other processes land in the -wal
+    file before the main file changes
+    """
+    path = layer.source().split('|')[0]
+    if not os.path.isfile(path):
+        return None
+    stamps = []
+    for source_file in _source_files(path):
+        status = os.stat(source_file)
+        stamps.append(f"{os.path.basename(source_file)}:{status.st_mtime_ns}-{status.st_size}")
+    return ";".join(stamps)
+
+
+def _watch_layer(layer):
+    """Drop the cached extent whenever the layer data changes in QGIS"""
+    if layer.id() in _WATCHED_LAYERS:
+        return
+    layer_id = layer.id()
+    
+    def forget():
+        # A reopened project can bring back a layer with the same id
+        _EXTENT_CACHE.pop(layer_id, None)
+        _WATCHED_LAYERS.discard(layer_id)
+    
+    layer.dataChanged.connect(lambda: _EXTENT_CACHE.pop(layer_id, None))
+    layer.willBeDeleted.connect(forget)
+    _WATCHED_LAYERS.add(layer_id)
+
+
+def _estimated_extent(layer):
+    """
+    Extent from provider metadata instead of scanning the data
+    
+    PostGIS layers are reopened with 'estimatedmetadata' so the extent
+    comes from table statistics (ST_EstimatedExtent).
+    """
+    if layer.providerType() == "postgres":
+        uri = QgsDataSourceUri(layer.source())
+        if not uri.useEstimatedMetadata():
+            uri.setUseEstimatedMetadata(True)
+            estimated = QgsVectorLayer(uri.uri(), layer.name(), "postgres")
+            if estimated.isValid():
+                return estimated.extent()
+    return layer.dataProvider().extent()
+
+
+def _layer_extent(layer, estimated, refresh):
+    """Layer extent, reusing the cached value while the data is unchanged"""
+    # Uncommitted edits change the extent without touching the source
+    if isinstance(layer, QgsVectorLayer) and layer.isModified():
+        return layer.extent()
+    
+    stamp = _data_stamp(layer)
+    cached = _EXTENT_CACHE.get(layer.id())
+    if cached and not refresh and cached[0] == (stamp, estimated):
+        return QgsRectangle(cached[1])
+    
+    if estimated and isinstance(layer, QgsVectorLayer):
+        extent = _estimated_extent(layer)
+    else:
+        extent = layer.extent()
+    
+    _watch_layer(layer)
+    _EXTENT_CACHE[layer.id()] = ((stamp, estimated), QgsRectangle(extent))
+    return extent
+
+
+def _selection_extent(layer):
+    """Bounding box of the selected features, fetched by fid without attributes"""
+    request = QgsFeatureRequest()
+    request.setFilterFids(list(layer.selectedFeatureIds()))
+    request.setNoAttributes()
+    
+    extent = QgsRectangle()
+    extent.setMinimal()
+    for feature in layer.getFeatures(request):
+        if feature.hasGeometry():
+            extent.combineExtentWith(feature.geometry().boundingBox())
+    return extent
+
+
+def execute(iface, params=None):
     """
     Zoom to the full extent of the active layer
     
     Args:
         iface: QGIS interface
+        params: Optional parameters ('selection' to zoom to the selected
+                features, 'estimated' to use provider-estimated extents,
+                'refresh' to ignore the cached extent)
     
     Returns:
         dict: Status and result message
@@ -18,26 +134,46 @@ def execute(iface):
             "message": "No active layer selected"
         }
     
+    if params is None:
+        params = {}
+    
     try:
         canvas = iface.mapCanvas()
-        extent = layer.extent()
         
-        # Check that extent is valid
-        if extent.isEmpty():
+        if params.get('selection', False):
+            if not isinstance(layer, QgsVectorLayer) or layer.selectedFeatureCount() == 0:
+                return {
+                    "status": "warning",
+                    "message": f"Layer '{layer.name()}' has no selected features"
+                }
+            extent = _selection_extent(layer)
+            target = f"{layer.selectedFeatureCount()} selected features of {layer.name()}"
+        else:
+            extent = _layer_extent(layer, params.get('estimated', False),
+                                   params.get('refresh', False))
+            target = f"layer: {layer.name()}"
+        
+        # Check that extent is valid (a single point is empty but not null)
+        if extent.isNull():
             return {
                 "status": "error",
                 "message": f"Layer '{layer.name()}' has no valid extent"
             }
         
+        extent = canvas.mapSettings().layerExtentToOutputExtent(layer, extent)
+        
         # Apply zoom
-        canvas.setExtent(extent)
+        if extent.isEmpty():
+            canvas.setCenter(extent.center())
+        else:
+            canvas.setExtent(extent)
         canvas.refresh()
         
         return {
             "status": "ok",
-            "message": f"Zoomed to layer: {layer.name()}"
+            "message": f"Zoomed to {target}"
         }
-        
+    
     except Exception as e:
         return {
             "status": "error",
@@ -0,0 +1,104 @@
+"""Publica la biblioteca de funciones como un paquete direccionado por contenido
+
+Uso:
+    python tools/build_bundle.py [carpeta_salida]   # por defecto dist/
+
+Estructura generada (se puede servir tal cual desde cualquier servidor
+estático, GitHub Pages o los assets de una release):
+
+    index.json                 puntero pequeño y mutable a la versión actual
+    manifests/<hash>.json      manifiesto de esa versión (inmutable)
+    objects/<sha256>           contenido de cada archivo por su hash (inmutable)
+    bundles/<hash>.zip         todo el árbol functions/ para el primer arranque
+
+Solo index.json cambia entre versiones. El cliente (tools/bundle_client.py)
+lo pide con una petición condicional y, si hay cambios, descarga solo los
+objetos cuyo hash no tiene.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import zipfile
+
+from build_manifest import RAIZ, construir_manifiesto, serializar
+
+CARPETA_SALIDA = os.path.join(RAIZ, "dist")
+
+# Fecha fija en el zip para que el mismo contenido produzca el mismo hash
+_FECHA_ZIP = (1980, 1, 1, 0, 0, 0)
+
+
+def _escribir_si_falta(ruta, contenido):
+    """Escribe un archivo inmutable solo si aún no existe"""
+    if os.path.exists(ruta):
+        return
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def _crear_zip(ruta, raiz, manifiesto_json, funciones):
+    """Zip reproducible con manifest.json y los archivos de functions/"""
+    with zipfile.ZipFile(ruta, 'w', zipfile.ZIP_DEFLATED) as paquete:
+        paquete.writestr(zipfile.ZipInfo("manifest.json", _FECHA_ZIP), manifiesto_json)
+        for funcion in funciones:
+            with open(os.path.join(raiz, funcion["path"]), 'rb') as archivo:
+                paquete.writestr(zipfile.ZipInfo(funcion["path"], _FECHA_ZIP), archivo.read())
+
+
+def construir_paquete(carpeta_salida=CARPETA_SALIDA, raiz=RAIZ):
+    """
+    Genera la estructura publicable en 'carpeta_salida' a partir del
+    árbol functions/ de 'raiz'
+    
+    Returns:
+        dict: El contenido de index.json
+    """
+    manifiesto = construir_manifiesto(os.path.join(raiz, "functions"))
+    manifiesto_json = serializar(manifiesto).encode("utf-8")
+    version = hashlib.sha256(manifiesto_json).hexdigest()
+    
+    # Objetos por hash: un archivo sin cambios conserva su URL entre versiones
+    for funcion in manifiesto["functions"]:
+        with open(os.path.join(raiz, funcion["path"]), 'rb') as archivo:
+            contenido = archivo.read()
+        _escribir_si_falta(os.path.join(carpeta_salida, "objects", funcion["sha256"]),
+                           contenido)
+    
+    ruta_manifiesto = f"manifests/{version}.json"
+    _escribir_si_falta(os.path.join(carpeta_salida, ruta_manifiesto), manifiesto_json)
+    
+    ruta_zip = f"bundles/{version}.zip"
+    if not os.path.exists(os.path.join(carpeta_salida, ruta_zip)):
+        os.makedirs(os.path.join(carpeta_salida, "bundles"), exist_ok=True)
+        temporal = os.path.join(carpeta_salida, ruta_zip + ".tmp")
+        _crear_zip(temporal, raiz, manifiesto_json, manifiesto["functions"])
+        os.replace(temporal, os.path.join(carpeta_salida, ruta_zip))
+    
+    indice = {
+        "version": version,
+        "manifest_version": manifiesto["version"],
+        "manifest": ruta_manifiesto,
+        "bundle": ruta_zip,
+        "functions": len(manifiesto["functions"]),
+    }
+    
+    # index.json se escribe al final: nunca apunta a archivos incompletos
+    ruta_indice = os.path.join(carpeta_salida, "index.json")
+    with open(ruta_indice + ".tmp", 'w', encoding='utf-8') as archivo:
+        json.dump(indice, archivo, indent=2, sort_keys=True)
+        archivo.write("\n")
+    os.replace(ruta_indice + ".tmp", ruta_indice)
+    
+    return indice
+
+
+if __name__ == "__main__":
+    salida = sys.argv[1] if len(sys.argv) > 1 else CARPETA_SALIDA
+    indice = construir_paquete(salida)
+    print(f"Versión {indice['version'][:12]} publicada en {salida} "
+          f"({indice['functions']} funciones)")
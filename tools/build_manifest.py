@@ -0,0 +1,157 @@
+"""Genera manifest.json con la descripción de todas las funciones
+
+Uso:
+    python tools/build_manifest.py          # escribe manifest.json
+    python tools/build_manifest.py --check  # falla si manifest.json no está al día
+
+El manifiesto permite al menú construirse con una sola descarga: por cada
+archivo de functions/<carpeta>/*.py registra la carpeta, el archivo, el
+nombre visible, el resumen del docstring, el punto de entrada
+(execute/ejecutar), los parámetros que lee de 'params' y el hash SHA-256
+del contenido. Los archivos se analizan con ast, sin importarlos, así que
+no hace falta QGIS para generarlo.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA_FUNCIONES = os.path.join(RAIZ, "functions")
+RUTA_MANIFIESTO = os.path.join(RAIZ, "manifest.json")
+
+VERSION_MANIFIESTO = 1
+PUNTOS_ENTRADA = ("execute", "ejecutar")
+
+
+def _valor_literal(nodo):
+    """Valor de un nodo si es un literal de Python, si no None"""
+    try:
+        return True, ast.literal_eval(nodo)
+    except (ValueError, TypeError, SyntaxError):
+        return False, None
+
+
+def _parametros(arbol):
+    """
+    Parámetros que el módulo lee del diccionario 'params'
+    
+    Reconoce params.get('clave', defecto), params['clave'] y 'clave' in params.
+    El tipo se deduce del valor por defecto cuando es un literal.
+    """
+    parametros = {}
+    
+    def registrar(clave, nodo_defecto=None):
+        es_literal, defecto = (_valor_literal(nodo_defecto)
+                               if nodo_defecto is not None else (True, None))
+        actual = parametros.get(clave)
+        # Conservar el primer valor por defecto literal encontrado
+        if actual is not None and (actual["default"] is not None or not es_literal):
+            return
+        parametros[clave] = {
+            "name": clave,
+            "type": type(defecto).__name__ if es_literal and defecto is not None else None,
+            "default": defecto if es_literal else None,
+        }
+    
+    for nodo in ast.walk(arbol):
+        if (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Attribute)
+                and nodo.func.attr == "get" and isinstance(nodo.func.value, ast.Name)
+                and nodo.func.value.id == "params" and nodo.args
+                and isinstance(nodo.args[0], ast.Constant)
+                and isinstance(nodo.args[0].value, str)):
+            registrar(nodo.args[0].value, nodo.args[1] if len(nodo.args) > 1 else None)
+        elif (isinstance(nodo, ast.Subscript) and isinstance(nodo.value, ast.Name)
+                and nodo.value.id == "params" and isinstance(nodo.slice, ast.Constant)
+                and isinstance(nodo.slice.value, str)):
+            registrar(nodo.slice.value)
+        elif (isinstance(nodo, ast.Compare) and isinstance(nodo.left, ast.Constant)
+                and isinstance(nodo.left.value, str) and len(nodo.ops) == 1
+                and isinstance(nodo.ops[0], (ast.In, ast.NotIn))
+                and isinstance(nodo.comparators[0], ast.Name)
+                and nodo.comparators[0].id == "params"):
+            registrar(nodo.left.value)
+    
+    return [parametros[clave] for clave in sorted(parametros)]
+
+
+def describir_funcion(ruta):
+    """Entrada del manifiesto para un archivo de functions/"""
+    with open(ruta, 'rb') as archivo:
+        contenido = archivo.read()
+    
+    arbol = ast.parse(contenido, filename=ruta)
+    docstring = ast.get_docstring(arbol) or ""
+    
+    punto_entrada = None
+    acepta_params = False
+    for nodo in arbol.body:
+        if isinstance(nodo, ast.FunctionDef) and nodo.name in PUNTOS_ENTRADA:
+            punto_entrada = nodo.name
+            acepta_params = len(nodo.args.args) > 1
+            break
+    
+    carpeta = os.path.basename(os.path.dirname(ruta))
+    archivo = os.path.basename(ruta)
+    nombre = os.path.splitext(archivo)[0]
+    
+    return {
+        "folder": carpeta,
+        "file": archivo,
+        "path": f"functions/{carpeta}/{archivo}",
+        "name": nombre.replace("_", " ").title(),
+        "summary": docstring.strip().split("\n")[0] if docstring else "",
+        "entry_point": punto_entrada,
+        "accepts_params": acepta_params,
+        "params": _parametros(arbol) if acepta_params else [],
+        "size": len(contenido),
+        "sha256": hashlib.sha256(contenido).hexdigest(),
+    }
+
+
+def construir_manifiesto(carpeta_funciones=CARPETA_FUNCIONES):
+    """Manifiesto de todas las funciones, ordenado por carpeta y archivo"""
+    funciones = []
+    for carpeta in sorted(os.listdir(carpeta_funciones)):
+        ruta_carpeta = os.path.join(carpeta_funciones, carpeta)
+        if not os.path.isdir(ruta_carpeta) or carpeta.startswith(("_", ".")):
+            continue
+        for archivo in sorted(os.listdir(ruta_carpeta)):
+            if archivo.endswith(".py") and not archivo.startswith("_"):
+                funciones.append(describir_funcion(os.path.join(ruta_carpeta, archivo)))
+    
+    return {
+        "version": VERSION_MANIFIESTO,
+        "functions": funciones,
+    }
+
+
+def serializar(manifiesto):
+    """JSON estable para que regenerar sin cambios no produzca diferencias"""
+    return json.dumps(manifiesto, indent=2, ensure_ascii=False, sort_keys=True) + "\n"
+
+
+def main(argumentos):
+    contenido = serializar(construir_manifiesto())
+    
+    if "--check" in argumentos:
+        actual = ""
+        if os.path.exists(RUTA_MANIFIESTO):
+            with open(RUTA_MANIFIESTO, encoding='utf-8') as archivo:
+                actual = archivo.read()
+        if actual != contenido:
+            print("manifest.json no está al día: ejecute python tools/build_manifest.py")
+            return 1
+        print("manifest.json al día")
+        return 0
+    
+    with open(RUTA_MANIFIESTO, 'w', encoding='utf-8') as archivo:
+        archivo.write(contenido)
+    print(f"manifest.json generado con {len(json.loads(contenido)['functions'])} funciones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
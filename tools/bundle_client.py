@@ -0,0 +1,176 @@
+"""Cliente de referencia para sincronizar la caché local con el paquete publicado
+
+Solo usa la biblioteca estándar, así que el plugin puede copiarlo tal cual.
+
+    from bundle_client import sincronizar
+    resultado = sincronizar("https://usuario.github.io/qgis-functions",
+                            carpeta_cache)
+
+Con la caché al día el arranque cuesta una sola petición condicional a
+index.json (respuesta 304). Si la versión cambió se descarga su manifiesto
+y solo los objetos cuyo hash no está en la caché; sin caché previa se
+descarga el zip completo. Todo lo descargado se verifica con SHA-256
+antes de reemplazar los archivos locales.
+"""
+
+import hashlib
+import io
+import json
+import os
+import urllib.error
+import urllib.request
+import zipfile
+
+ARCHIVO_ESTADO = "bundle_state.json"
+
+
+class _Descargador:
+    """Peticiones HTTP contando las que llegan al servidor"""
+    
+    def __init__(self, url_base, timeout, cabeceras=None):
+        self.url_base = url_base.rstrip("/")
+        self.timeout = timeout
+        self.cabeceras = cabeceras or {}
+        self.peticiones = 0
+    
+    def obtener(self, ruta, cabeceras=None):
+        """Devuelve (estado HTTP, cabeceras, contenido)"""
+        peticion = urllib.request.Request(f"{self.url_base}/{ruta}",
+                                          headers={**self.cabeceras, **(cabeceras or {})})
+        self.peticiones += 1
+        try:
+            with urllib.request.urlopen(peticion, timeout=self.timeout) as respuesta:
+                return respuesta.status, respuesta.headers, respuesta.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, e.headers, b""
+            raise
+
+
+def _leer_estado(carpeta_cache):
+    ruta = os.path.join(carpeta_cache, ARCHIVO_ESTADO)
+    if not os.path.exists(ruta):
+        return {}
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_estado(carpeta_cache, estado):
+    ruta = os.path.join(carpeta_cache, ARCHIVO_ESTADO)
+    with open(ruta + ".tmp", 'w', encoding='utf-8') as archivo:
+        json.dump(estado, archivo, indent=2, sort_keys=True)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def _escribir_verificado(carpeta_cache, ruta_relativa, contenido, sha256):
+    """Escribe un archivo de la caché tras comprobar su hash"""
+    if hashlib.sha256(contenido).hexdigest() != sha256:
+        raise ValueError(f"Hash incorrecto para {ruta_relativa}")
+    ruta = os.path.join(carpeta_cache, *ruta_relativa.split("/"))
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta + ".tmp", 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def _archivo_valido(carpeta_cache, ruta_relativa, sha256, archivos_previos):
+    """Un archivo se reutiliza si el estado local registra el mismo hash y existe"""
+    return (archivos_previos.get(ruta_relativa) == sha256
+            and os.path.exists(os.path.join(carpeta_cache, *ruta_relativa.split("/"))))
+
+
+def sincronizar(url_base, carpeta_cache, timeout=30, cabeceras=None):
+    """
+    Actualiza 'carpeta_cache' con la versión publicada en 'url_base'
+    
+    Args:
+        url_base: URL de la carpeta generada por tools/build_bundle.py
+        carpeta_cache: Carpeta local con functions/ y el estado de la caché
+        timeout: Segundos de espera por petición
+        cabeceras: Cabeceras extra (por ejemplo Authorization)
+    
+    Returns:
+        dict: 'status' (sin_cambios, actualizado o completo), 'version',
+              'descargados', 'eliminados' y 'peticiones'
+    """
+    os.makedirs(carpeta_cache, exist_ok=True)
+    estado = _leer_estado(carpeta_cache)
+    descargador = _Descargador(url_base, timeout, cabeceras)
+    
+    # 1. Petición condicional del índice
+    condiciones = {}
+    if estado.get("etag"):
+        condiciones["If-None-Match"] = estado["etag"]
+    if estado.get("last_modified"):
+        condiciones["If-Modified-Since"] = estado["last_modified"]
+    codigo, cabeceras_indice, contenido = descargador.obtener("index.json", condiciones)
+    
+    if codigo == 304:
+        return {
+            "status": "sin_cambios",
+            "version": estado.get("version"),
+            "descargados": 0,
+            "eliminados": 0,
+            "peticiones": descargador.peticiones
+        }
+    
+    indice = json.loads(contenido)
+    archivos_previos = estado.get("archivos", {})
+    descargados = 0
+    
+    if indice["version"] == estado.get("version"):
+        manifiesto = None  # Índice reescrito sin cambio de versión
+        archivos = archivos_previos
+        tipo = "sin_cambios"
+    elif not archivos_previos:
+        # 2a. Primer arranque: el zip completo en una sola descarga
+        _, _, datos_zip = descargador.obtener(indice["bundle"])
+        with zipfile.ZipFile(io.BytesIO(datos_zip)) as paquete:
+            manifiesto = json.loads(paquete.read("manifest.json"))
+            for funcion in manifiesto["functions"]:
+                _escribir_verificado(carpeta_cache, funcion["path"],
+                                     paquete.read(funcion["path"]), funcion["sha256"])
+                descargados += 1
+        tipo = "completo"
+    else:
+        # 2b. Versión nueva: manifiesto y solo los objetos que cambiaron
+        _, _, datos_manifiesto = descargador.obtener(indice["manifest"])
+        manifiesto = json.loads(datos_manifiesto)
+        for funcion in manifiesto["functions"]:
+            if _archivo_valido(carpeta_cache, funcion["path"], funcion["sha256"],
+                               archivos_previos):
+                continue
+            _, _, datos = descargador.obtener(f"objects/{funcion['sha256']}")
+            _escribir_verificado(carpeta_cache, funcion["path"], datos, funcion["sha256"])
+            descargados += 1
+        tipo = "actualizado"
+    
+    # 3. Eliminar las funciones retiradas de la biblioteca
+    eliminados = 0
+    if manifiesto is not None:
+        archivos = {funcion["path"]: funcion["sha256"] for funcion in manifiesto["functions"]}
+        with open(os.path.join(carpeta_cache, "manifest.json"), 'w', encoding='utf-8') as archivo:
+            json.dump(manifiesto, archivo, indent=2, sort_keys=True, ensure_ascii=False)
+        for ruta_relativa in set(archivos_previos) - set(archivos):
+            ruta = os.path.join(carpeta_cache, *ruta_relativa.split("/"))
+            if os.path.exists(ruta):
+                os.remove(ruta)
+                eliminados += 1
+    
+    _guardar_estado(carpeta_cache, {
+        "version": indice["version"],
+        "etag": cabeceras_indice.get("ETag"),
+        "last_modified": cabeceras_indice.get("Last-Modified"),
+        "archivos": archivos,
+    })
+    
+    return {
+        "status": tipo,
+        "version": indice["version"],
+        "descargados": descargados,
+        "eliminados": eliminados,
+        "peticiones": descargador.peticiones
+    }
@@ -0,0 +1,89 @@
+"""Mide el tiempo de importación de cada función y falla si supera un presupuesto
+
+Uso (con el Python de QGIS):
+    python tools/check_import_time.py [--presupuesto-ms 50] [--json]
+
+Cada módulo se importa en un proceso nuevo después de cargar qgis.core y
+qgis.PyQt, que el plugin ya tiene cargados, así que el tiempo medido es
+solo el del propio módulo y de lo que arrastra. Además del tiempo se
+listan los paquetes nuevos que importa, para localizar las importaciones
+que deberían hacerse dentro de ejecutar/execute.
+
+Los archivos sin punto de entrada (scripts que se ejecutan al cargarse)
+se omiten: importarlos equivale a ejecutarlos.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from build_manifest import RAIZ, construir_manifiesto
+
+PRESUPUESTO_MS = 50
+
+# Código del proceso hijo: importa la base de QGIS y luego el módulo
+_MEDIR = r"""
+import importlib.util, json, sys, time
+import qgis.core, qgis.gui, qgis.PyQt.QtCore, qgis.PyQt.QtGui, qgis.PyQt.QtWidgets
+antes = set(sys.modules)
+inicio = time.perf_counter()
+spec = importlib.util.spec_from_file_location("funcion_medida", sys.argv[1])
+modulo = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(modulo)
+milisegundos = (time.perf_counter() - inicio) * 1000
+nuevos = sorted({nombre.split(".")[0] for nombre in set(sys.modules) - antes
+                 if not nombre.startswith("_")})
+print(json.dumps({"ms": milisegundos, "nuevos": nuevos}))
+"""
+
+
+def medir_modulo(ruta, repeticiones=3):
+    """
+    Tiempo de importación de un módulo (el mejor de 'repeticiones') y
+    paquetes que carga; devuelve un dict con 'error' si no se puede importar
+    """
+    mejor = None
+    for _ in range(repeticiones):
+        proceso = subprocess.run([sys.executable, "-c", _MEDIR, ruta],
+                                 capture_output=True, text=True)
+        if proceso.returncode != 0:
+            lineas = proceso.stderr.strip().splitlines()
+            return {"error": lineas[-1] if lineas else f"código {proceso.returncode}"}
+        resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+        if mejor is None or resultado["ms"] < mejor["ms"]:
+            mejor = resultado
+    return mejor
+
+
+def main(argumentos):
+    presupuesto = PRESUPUESTO_MS
+    if "--presupuesto-ms" in argumentos:
+        presupuesto = float(argumentos[argumentos.index("--presupuesto-ms") + 1])
+    
+    resultados = []
+    for funcion in construir_manifiesto()["functions"]:
+        if not funcion["entry_point"]:
+            continue
+        medida = medir_modulo(os.path.join(RAIZ, funcion["path"]))
+        medida["path"] = funcion["path"]
+        medida["ok"] = "error" not in medida and medida["ms"] <= presupuesto
+        resultados.append(medida)
+    
+    if "--json" in argumentos:
+        print(json.dumps({"budget_ms": presupuesto, "modules": resultados}, indent=2))
+    else:
+        for medida in resultados:
+            if "error" in medida:
+                print(f"ERROR  {medida['path']}: {medida['error']}")
+            else:
+                estado = "ok   " if medida["ok"] else "LENTO"
+                print(f"{estado}  {medida['ms']:8.1f} ms  {medida['path']}"
+                      + (f"  ({', '.join(medida['nuevos'])})" if medida["nuevos"] else ""))
+        print(f"Presupuesto: {presupuesto:.0f} ms por módulo")
+    
+    return 0 if all(medida["ok"] for medida in resultados) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,238 @@
+"""Compila access_control.json en un índice de permisos precalculado
+
+Uso:
+    python tools/compile_access.py [carpeta_cache]
+
+Cruza las reglas de access_control.json (carpetas, funciones permitidas y
+denegadas con comodín "*", grupos y niveles de acceso) con manifest.json y
+obtiene, para cada usuario y token, una máscara de bits sobre los ids de
+función (el orden del manifiesto). Comprobar un permiso queda en buscar la
+máscara y leer un bit; la caducidad de los tokens se resuelve al compilar
+como una marca de tiempo.
+
+Precedencia de las reglas, de mayor a menor:
+    1. access_level "admin": todas las funciones
+    2. allowed_functions del usuario
+    3. denied_functions del usuario ("*" deniega todo lo demás)
+    4. allowed_functions / additional_functions de sus grupos y
+       allowed_folders del usuario
+    5. denied_functions de sus grupos
+    6. allowed_folders de sus grupos y default_access
+
+El índice se guarda en la carpeta de caché con un nombre que incluye el
+hash de ambos archivos, así que se recompila solo cuando alguno cambia.
+"""
+
+import datetime
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_CONTROL = os.path.join(RAIZ, "access_control.json")
+RUTA_MANIFIESTO = os.path.join(RAIZ, "manifest.json")
+
+VERSION_INDICE = 1
+PREFIJO_CACHE = "access_index_"
+
+
+def _id_funcion(carpeta, funcion):
+    return f"{carpeta}/{funcion}"
+
+
+def _caducidad(fecha):
+    """Marca de tiempo en que caduca un token válido hasta el final de 'fecha'"""
+    if not fecha:
+        return None
+    dia = datetime.datetime.strptime(fecha, "%Y-%m-%d") + datetime.timedelta(days=1)
+    return int(time.mktime(dia.timetuple()))
+
+
+class _Mascaras:
+    """Máscaras de bits por carpeta y por nombre de función"""
+    
+    def __init__(self, manifiesto):
+        self.ids = []
+        self.por_carpeta = {}
+        self.por_nombre = {}
+        for bit, funcion in enumerate(manifiesto["functions"]):
+            nombre = os.path.splitext(funcion["file"])[0]
+            self.ids.append(_id_funcion(funcion["folder"], nombre))
+            self.por_carpeta[funcion["folder"]] = self.por_carpeta.get(funcion["folder"], 0) | (1 << bit)
+            self.por_nombre[nombre] = self.por_nombre.get(nombre, 0) | (1 << bit)
+        self.todas = (1 << len(self.ids)) - 1
+    
+    def carpetas(self, nombres):
+        if "*" in nombres:
+            return self.todas
+        mascara = 0
+        for nombre in nombres:
+            mascara |= self.por_carpeta.get(nombre, 0)
+        return mascara
+    
+    def funciones(self, nombres):
+        if "*" in nombres:
+            return self.todas
+        mascara = 0
+        for nombre in nombres:
+            mascara |= self.por_nombre.get(nombre, 0)
+        return mascara
+
+
+def _mascara_usuario(usuario, grupos, mascaras, base):
+    """Aplica la precedencia de reglas de un usuario y sus grupos"""
+    if usuario.get("access_level") == "admin":
+        return mascaras.todas
+    
+    permitidas_usuario = mascaras.funciones(usuario.get("allowed_functions", []))
+    denegadas_usuario = mascaras.funciones(usuario.get("denied_functions", []))
+    carpetas_usuario = mascaras.carpetas(usuario.get("allowed_folders", []))
+    
+    permitidas_grupo = denegadas_grupo = carpetas_grupo = 0
+    for grupo in grupos:
+        permitidas_grupo |= mascaras.funciones(grupo.get("allowed_functions", []) +
+                                               grupo.get("additional_functions", []))
+        denegadas_grupo |= mascaras.funciones(grupo.get("denied_functions", []))
+        carpetas_grupo |= mascaras.carpetas(grupo.get("allowed_folders", []))
+    
+    return (permitidas_usuario
+            | ((carpetas_usuario | permitidas_grupo) & ~denegadas_usuario)
+            | ((carpetas_grupo | base) & ~denegadas_usuario & ~denegadas_grupo)) & mascaras.todas
+
+
+def compilar(control, manifiesto, ahora=None):
+    """
+    Compila las reglas de acceso sobre las funciones del manifiesto
+    
+    Args:
+        control: Contenido de access_control.json
+        manifiesto: Contenido de manifest.json
+        ahora: Marca de tiempo de referencia para descartar tokens caducados
+    
+    Returns:
+        dict: Índice serializable ('functions', 'masks', 'users', 'tokens')
+    """
+    reglas = control.get("access_control", {})
+    mascaras = _Mascaras(manifiesto)
+    ahora = time.time() if ahora is None else ahora
+    
+    indice = {
+        "version": VERSION_INDICE,
+        "enabled": bool(reglas.get("enabled", False)),
+        "functions": mascaras.ids,
+        "masks": [],
+        "users": {},
+        "tokens": {},
+    }
+    if not indice["enabled"]:
+        return indice
+    
+    base = mascaras.todas if reglas.get("default_access", "deny") == "allow" else 0
+    
+    grupos_usuario = {}
+    for grupo in reglas.get("groups", {}).values():
+        for miembro in grupo.get("members", []):
+            grupos_usuario.setdefault(miembro, []).append(grupo)
+    
+    # Muchos usuarios comparten permisos: cada máscara distinta se guarda una vez
+    posiciones = {}
+    for id_usuario, usuario in reglas.get("users", {}).items():
+        mascara = _mascara_usuario(usuario, grupos_usuario.get(id_usuario, []), mascaras, base)
+        if mascara not in posiciones:
+            posiciones[mascara] = len(indice["masks"])
+            indice["masks"].append(format(mascara, "x"))
+        indice["users"][id_usuario] = posiciones[mascara]
+    
+    for token, datos in reglas.get("tokens", {}).items():
+        id_usuario = datos.get("user")
+        caduca = _caducidad(datos.get("expires"))
+        if id_usuario not in indice["users"] or (caduca is not None and caduca <= ahora):
+            continue
+        indice["tokens"][token] = {
+            "user": id_usuario,
+            "mask": indice["users"][id_usuario],
+            "expires_at": caduca,
+        }
+    
+    return indice
+
+
+class IndicePermisos:
+    """Consultas O(1) sobre un índice compilado"""
+    
+    def __init__(self, indice):
+        self.habilitado = indice["enabled"]
+        self.bits = {id_funcion: bit for bit, id_funcion in enumerate(indice["functions"])}
+        self.mascaras = [int(mascara, 16) for mascara in indice["masks"]]
+        self.usuarios = indice["users"]
+        self.tokens = indice["tokens"]
+    
+    def _permitido(self, mascara, carpeta, funcion):
+        bit = self.bits.get(_id_funcion(carpeta, funcion))
+        return bit is not None and (self.mascaras[mascara] >> bit) & 1 == 1
+    
+    def permitido(self, token, carpeta, funcion, ahora=None):
+        """Si el token da acceso a functions/<carpeta>/<funcion>.py"""
+        if not self.habilitado:
+            return True
+        datos = self.tokens.get(token)
+        if datos is None:
+            return False
+        ahora = time.time() if ahora is None else ahora
+        if datos["expires_at"] is not None and ahora >= datos["expires_at"]:
+            return False
+        return self._permitido(datos["mask"], carpeta, funcion)
+    
+    def permitido_usuario(self, usuario, carpeta, funcion):
+        """Si el usuario tiene acceso a functions/<carpeta>/<funcion>.py"""
+        if not self.habilitado:
+            return True
+        mascara = self.usuarios.get(usuario)
+        return mascara is not None and self._permitido(mascara, carpeta, funcion)
+
+
+def cargar_indice(carpeta_cache, ruta_control=RUTA_CONTROL, ruta_manifiesto=RUTA_MANIFIESTO):
+    """
+    Índice de permisos desde la caché, compilándolo si las reglas o el
+    manifiesto cambiaron o si algún token ha caducado desde la compilación
+    """
+    with open(ruta_control, 'rb') as archivo:
+        datos_control = archivo.read()
+    with open(ruta_manifiesto, 'rb') as archivo:
+        datos_manifiesto = archivo.read()
+    
+    clave = hashlib.sha256(datos_control + b"\0" + datos_manifiesto).hexdigest()[:16]
+    ruta_cache = os.path.join(carpeta_cache, f"{PREFIJO_CACHE}{clave}.json")
+    
+    if os.path.exists(ruta_cache):
+        try:
+            with open(ruta_cache, encoding='utf-8') as archivo:
+                indice = json.load(archivo)
+            ahora = time.time()
+            vigente = all(datos["expires_at"] is None or datos["expires_at"] > ahora
+                          for datos in indice["tokens"].values())
+            if indice.get("version") == VERSION_INDICE and vigente:
+                return IndicePermisos(indice)
+        except (OSError, ValueError, KeyError):
+            pass
+    
+    indice = compilar(json.loads(datos_control), json.loads(datos_manifiesto))
+    
+    os.makedirs(carpeta_cache, exist_ok=True)
+    for anterior in glob.glob(os.path.join(carpeta_cache, f"{PREFIJO_CACHE}*.json")):
+        os.remove(anterior)
+    with open(ruta_cache + ".tmp", 'w', encoding='utf-8') as archivo:
+        json.dump(indice, archivo, separators=(",", ":"))
+    os.replace(ruta_cache + ".tmp", ruta_cache)
+    
+    return IndicePermisos(indice)
+
+
+if __name__ == "__main__":
+    carpeta = sys.argv[1] if len(sys.argv) > 1 else os.path.join(RAIZ, "dist")
+    permisos = cargar_indice(carpeta)
+    print(f"Índice de permisos en {carpeta}: {len(permisos.usuarios)} usuarios, "
+          f"{len(permisos.tokens)} tokens vigentes, {len(permisos.bits)} funciones")
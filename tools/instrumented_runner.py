@@ -0,0 +1,232 @@
+"""Ejecuta una función del menú registrando métricas de la ejecución
+
+Uso desde el plugin, en lugar de llamar directamente a ejecutar/execute:
+
+    from instrumented_runner import ejecutar_instrumentado
+    resultado = ejecutar_instrumentado(modulo, iface, params)
+
+El diccionario devuelto por la función se completa con la clave 'metrics':
+tiempo transcurrido y de CPU, entidades procesadas y entidades por segundo,
+pico de memoria residente, y llamadas al proveedor de datos (lecturas y
+escrituras hechas desde Python). Las métricas se envían a QgsMessageLog y
+se añaden a un archivo JSONL local con rotación por tamaño. Con
+perfil=True la ejecución se captura además con cProfile en un .prof.
+
+Las entidades procesadas son las que la función indique con la clave
+'features' del resultado; si no la devuelve se registran como None.
+"""
+
+import cProfile
+import inspect
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from qgis.core import (Qgis, QgsApplication, QgsMessageLog, QgsVectorDataProvider,
+                       QgsVectorLayer, QgsVectorLayerFeatureSource)
+
+ETIQUETA_LOG = "NxW Tools"
+MAX_BYTES_REGISTRO = 5 * 1024 * 1024
+COPIAS_REGISTRO = 3
+INTERVALO_MEMORIA = 0.05
+
+# Métodos que se cuentan como viajes al proveedor de datos
+_LLAMADAS_PROVEEDOR = {
+    QgsVectorLayer: ("getFeatures", "getSelectedFeatures", "uniqueValues",
+                     "minimumValue", "maximumValue"),
+    QgsVectorLayerFeatureSource: ("getFeatures",),
+    QgsVectorDataProvider: ("getFeatures", "addFeatures", "deleteFeatures",
+                            "changeGeometryValues", "changeAttributeValues",
+                            "uniqueValues"),
+}
+
+
+def carpeta_metricas():
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), "cache", "nxw_metrics")
+
+
+def _rss_mb():
+    """Memoria residente actual del proceso en MB, o None si no se puede leer"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _MonitorMemoria(threading.Thread):
+    """Muestrea la memoria residente durante la ejecución para obtener el pico"""
+    
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.inicial = _rss_mb()
+        self.pico = self.inicial
+        self._parar = threading.Event()
+    
+    def run(self):
+        while not self._parar.wait(INTERVALO_MEMORIA):
+            actual = _rss_mb()
+            if actual is not None and (self.pico is None or actual > self.pico):
+                self.pico = actual
+    
+    def detener(self):
+        self._parar.set()
+        self.join()
+        actual = _rss_mb()
+        if actual is not None and (self.pico is None or actual > self.pico):
+            self.pico = actual
+
+
+class _ContadorProveedor:
+    """Envuelve temporalmente los métodos de acceso a datos para contarlos"""
+    
+    def __init__(self):
+        self.llamadas = {}
+        self._originales = []
+        self._bloqueo = threading.Lock()
+    
+    def _envolver(self, clase, nombre):
+        original = getattr(clase, nombre)
+        clave = f"{clase.__name__}.{nombre}"
+        contador = self
+        
+        def envoltura(*args, **kwargs):
+            with contador._bloqueo:
+                contador.llamadas[clave] = contador.llamadas.get(clave, 0) + 1
+            return original(*args, **kwargs)
+        
+        setattr(clase, nombre, envoltura)
+        self._originales.append((clase, nombre, original))
+    
+    def __enter__(self):
+        for clase, nombres in _LLAMADAS_PROVEEDOR.items():
+            for nombre in nombres:
+                self._envolver(clase, nombre)
+        return self
+    
+    def __exit__(self, *excepcion):
+        for clase, nombre, original in reversed(self._originales):
+            setattr(clase, nombre, original)
+        self._originales = []
+
+
+def _rotar(ruta):
+    """Rota el registro cuando supera MAX_BYTES_REGISTRO"""
+    if not os.path.exists(ruta) or os.path.getsize(ruta) < MAX_BYTES_REGISTRO:
+        return
+    for indice in range(COPIAS_REGISTRO - 1, 0, -1):
+        if os.path.exists(f"{ruta}.{indice}"):
+            os.replace(f"{ruta}.{indice}", f"{ruta}.{indice + 1}")
+    os.replace(ruta, f"{ruta}.1")
+
+
+def registrar_metricas(metricas, ruta_registro=None):
+    """Añade una línea JSON al registro local de métricas"""
+    ruta = ruta_registro or os.path.join(carpeta_metricas(), "metrics.jsonl")
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    _rotar(ruta)
+    with open(ruta, 'a', encoding='utf-8') as archivo:
+        archivo.write(json.dumps(metricas, ensure_ascii=False, default=str) + "\n")
+
+
+def ejecutar_instrumentado(modulo, iface, params=None, perfil=False, ruta_registro=None):
+    """
+    Ejecuta el punto de entrada de 'modulo' y añade 'metrics' a su resultado
+    
+    Args:
+        modulo: Módulo de functions/ ya cargado
+        iface: Interfaz de QGIS
+        params: Parámetros para la función
+        perfil: Capturar la ejecución con cProfile
+        ruta_registro: Archivo JSONL de métricas (por defecto en la caché de QGIS)
+    
+    Returns:
+        dict: Resultado de la función con la clave 'metrics'
+    """
+    funcion = getattr(modulo, "ejecutar", None) or getattr(modulo, "execute")
+    nombre = getattr(modulo, "__file__", None) or modulo.__name__
+    acepta_params = len(inspect.signature(funcion).parameters) > 1
+    argumentos = (iface, params) if acepta_params else (iface,)
+    
+    perfilador = cProfile.Profile() if perfil else None
+    contador = _ContadorProveedor()
+    monitor = _MonitorMemoria()
+    monitor.start()
+    resultado = None
+    error = None
+    
+    inicio_fecha = datetime.now().isoformat(timespec="seconds")
+    inicio = time.perf_counter()
+    inicio_cpu = time.process_time()
+    try:
+        with contador:
+            if perfilador:
+                resultado = perfilador.runcall(funcion, *argumentos)
+            else:
+                resultado = funcion(*argumentos)
+    except Exception as e:
+        error = e
+    finally:
+        transcurrido = time.perf_counter() - inicio
+        cpu = time.process_time() - inicio_cpu
+        monitor.detener()
+    
+    if isinstance(resultado, dict):
+        estado = resultado.get("status")
+        entidades = resultado.get("features")
+    else:
+        estado = "error" if error is not None else None
+        entidades = None
+    
+    metricas = {
+        "function": "/".join(os.path.normpath(nombre).split(os.sep)[-2:]),
+        "started": inicio_fecha,
+        "status": estado,
+        "elapsed_s": round(transcurrido, 4),
+        "cpu_s": round(cpu, 4),
+        "features": entidades,
+        "features_per_s": round(entidades / transcurrido, 1)
+                          if entidades and transcurrido > 0 else None,
+        "peak_rss_mb": round(monitor.pico, 1) if monitor.pico is not None else None,
+        "rss_delta_mb": round(monitor.pico - monitor.inicial, 1)
+                        if monitor.pico is not None and monitor.inicial is not None else None,
+        "provider_calls": contador.llamadas,
+        "provider_round_trips": sum(contador.llamadas.values()),
+    }
+    if error is not None:
+        metricas["error"] = str(error)
+    
+    if perfilador:
+        os.makedirs(carpeta_metricas(), exist_ok=True)
+        base = os.path.splitext(os.path.basename(nombre))[0]
+        ruta_perfil = os.path.join(carpeta_metricas(),
+                                   f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+        perfilador.dump_stats(ruta_perfil)
+        metricas["profile"] = ruta_perfil
+    
+    QgsMessageLog.logMessage(
+        f"{metricas['function']}: {metricas['elapsed_s']:.2f} s, "
+        f"{metricas['features'] or 0} entidades, "
+        f"{metricas['provider_round_trips']} llamadas al proveedor, "
+        f"pico {metricas['peak_rss_mb'] or 0:.0f} MB",
+        ETIQUETA_LOG, Qgis.Info
+    )
+    try:
+        registrar_metricas(metricas, ruta_registro)
+    except OSError as e:
+        QgsMessageLog.logMessage(f"No se pudieron guardar las métricas: {e}",
+                                 ETIQUETA_LOG, Qgis.Warning)
+    
+    if error is not None:
+        raise error
+    
+    if isinstance(resultado, dict):
+        resultado["metrics"] = metricas
+    return resultado